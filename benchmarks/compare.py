@@ -0,0 +1,50 @@
+"""
+Compare two ``benchmarks.run`` reports.
+
+Usage: python -m benchmarks.compare old.json new.json
+"""
+
+import json
+import sys
+
+
+def _flatten(row: dict, prefix: str = "") -> dict:
+    values = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            values.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+
+def _compare(title: str, old_rows: list, new_rows: list, key):
+    old_rows = {key(row): _flatten(row) for row in old_rows}
+    for row in new_rows:
+        old = old_rows.get(key(row))
+        if old is None:
+            continue
+        print(f"\n{title} {key(row)}")
+        for name, value in _flatten(row).items():
+            if name not in old:
+                continue
+            change = f"{(value - old[name]) / old[name] * 100:+.1f}%" if old[name] else ""
+            print(f"  {name:<40} {old[name]:>14} -> {value:<14} {change}")
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__.strip())
+
+    with open(sys.argv[1]) as f:
+        old = json.load(f)
+    with open(sys.argv[2]) as f:
+        new = json.load(f)
+
+    print(f"{old['version']} ({old['created_at']}) -> {new['version']} ({new['created_at']})")
+    _compare("status loop, jobs =", old["status_loop"], new["status_loop"], lambda row: row["jobs"])
+    _compare("upload", old["upload"], new["upload"], lambda row: (row["reader"], row["chunk_size"]))
+
+
+if __name__ == "__main__":
+    main()
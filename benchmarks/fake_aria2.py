@@ -0,0 +1,226 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import Counter
+
+from aiohttp import WSMsgType, web
+
+
+class FakeDownload:
+    """A download that "progresses" at a fixed speed once unpaused."""
+
+    def __init__(self, gid: str, uri: str, total: int, speed: int, download_dir: str, paused: bool):
+        self.gid = gid
+        self.uri = uri
+        self.total = total
+        self.speed = speed
+        self.path = os.path.join(download_dir, os.path.basename(uri.rstrip("/")) or gid)
+        self.status = "paused" if paused else "active"
+        self.elapsed = 0.0
+        self.resumed_at = None if paused else time.monotonic()
+        self.notified = False
+
+    def completed(self, now: float) -> int:
+        elapsed = self.elapsed + (now - self.resumed_at if self.resumed_at else 0)
+        return min(self.total, int(elapsed * self.speed))
+
+    def refresh(self, now: float):
+        if self.status == "active" and self.completed(now) >= self.total:
+            self.status = "complete"
+            self.resumed_at = None
+            self.elapsed = self.total / self.speed
+
+    def status_dict(self, now: float, keys: list = None) -> dict:
+        self.refresh(now)
+        active = self.status == "active"
+        status = {
+            "gid": self.gid,
+            "status": self.status,
+            "totalLength": str(self.total),
+            "completedLength": str(self.completed(now)),
+            "downloadSpeed": str(self.speed if active else 0),
+            "errorMessage": "",
+            "dir": os.path.dirname(self.path),
+            "files": [{"index": "1", "path": self.path, "length": str(self.total), "selected": "true"}],
+            "bitfield": "",
+            "pieceLength": "1048576",
+        }
+        return {key: status[key] for key in keys if key in status} if keys else status
+
+
+class FakeAria2:
+    """
+    Local stand-in for aria2's JSON-RPC websocket interface.
+
+    Implements the subset of methods the bot uses, counts every call (and every
+    call batched inside ``system.multicall``) and pushes ``onDownloadComplete``
+    notifications like the real daemon.
+    """
+
+    def __init__(self, download_dir: str, total: int = 10 * 1024**3, speed: int = 1024**2, host: str = "127.0.0.1"):
+        self.download_dir = download_dir
+        self.total = total
+        self.speed = speed
+        self.host = host
+        self.port = None
+        self.downloads: dict[str, FakeDownload] = {}
+        # Websocket round-trips, and calls per method including the ones batched in a multicall
+        self.round_trips = 0
+        self.calls = Counter()
+        self.sockets = set()
+        self._gids = itertools.count(1)
+        self._runner = None
+        self._notifier = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/jsonrpc"
+
+    def reset_counters(self):
+        self.round_trips = 0
+        self.calls.clear()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/jsonrpc", self._websocket)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._notifier = asyncio.create_task(self._notify_loop())
+
+    async def stop(self):
+        self._notifier.cancel()
+        for ws in list(self.sockets):
+            await ws.close()
+        await self._runner.cleanup()
+
+    async def _websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = msg.json()
+                self.round_trips += 1
+                response = {"jsonrpc": "2.0", "id": data.get("id")}
+                try:
+                    response["result"] = self._call(data["method"], data.get("params", []))
+                except Exception as e:
+                    response["error"] = {"code": 1, "message": str(e)}
+                await ws.send_json(response)
+        finally:
+            self.sockets.discard(ws)
+        return ws
+
+    def _call(self, method: str, params: list):
+        if params and isinstance(params[0], str) and params[0].startswith("token:"):
+            params = params[1:]
+        self.calls[method] += 1
+
+        if method == "system.multicall":
+            results = []
+            for call in params[0]:
+                try:
+                    results.append([self._call(call["methodName"], call.get("params", []))])
+                except Exception as e:
+                    results.append({"faultCode": 1, "faultString": str(e)})
+            return results
+
+        name = method.removeprefix("aria2.")
+        handler = getattr(self, f"rpc_{name}", None)
+        if handler is None:
+            raise Exception(f"Method {method} not implemented by the fake aria2.")
+        return handler(*params)
+
+    def _get(self, gid: str) -> FakeDownload:
+        download = self.downloads.get(gid)
+        if download is None:
+            raise Exception(f"GID {gid} is not found")
+        return download
+
+    async def _notify_loop(self):
+        while True:
+            await asyncio.sleep(0.5)
+            now = time.monotonic()
+            for download in self.downloads.values():
+                download.refresh(now)
+                if download.status == "complete" and not download.notified:
+                    download.notified = True
+                    notification = {"jsonrpc": "2.0", "method": "aria2.onDownloadComplete", "params": [{"gid": download.gid}]}
+                    for ws in list(self.sockets):
+                        await ws.send_json(notification)
+
+    # aria2 RPC methods
+
+    def rpc_getVersion(self):
+        return {"version": "1.37.0-fake", "enabledFeatures": []}
+
+    def rpc_changeGlobalOption(self, options: dict):
+        return "OK"
+
+    def rpc_changeOption(self, gid: str, options: dict):
+        self._get(gid)
+        return "OK"
+
+    def rpc_getGlobalStat(self):
+        active = sum(1 for download in self.downloads.values() if download.status == "active")
+        waiting = sum(1 for download in self.downloads.values() if download.status == "paused")
+        return {
+            "numActive": str(active),
+            "numWaiting": str(waiting),
+            "downloadSpeed": str(active * self.speed),
+            "uploadSpeed": "0",
+        }
+
+    def rpc_addUri(self, uris: list, options: dict = None):
+        gid = f"{next(self._gids):016x}"
+        paused = (options or {}).get("pause") == "true"
+        self.downloads[gid] = FakeDownload(gid, uris[0], self.total, self.speed, self.download_dir, paused)
+        return gid
+
+    def rpc_tellStatus(self, gid: str, keys: list = None):
+        return self._get(gid).status_dict(time.monotonic(), keys)
+
+    def rpc_getFiles(self, gid: str):
+        return self._get(gid).status_dict(time.monotonic())["files"]
+
+    def rpc_pause(self, gid: str):
+        download = self._get(gid)
+        if download.status == "active":
+            download.elapsed += time.monotonic() - download.resumed_at
+            download.resumed_at = None
+            download.status = "paused"
+        return gid
+
+    def rpc_unpause(self, gid: str):
+        download = self._get(gid)
+        if download.status != "paused":
+            raise Exception(f"GID {gid} cannot be unpaused now")
+        download.status = "active"
+        download.resumed_at = time.monotonic()
+        return gid
+
+    def rpc_remove(self, gid: str):
+        download = self._get(gid)
+        download.status = "removed"
+        download.resumed_at = None
+        return gid
+
+    rpc_forceRemove = rpc_remove
+
+    def rpc_removeDownloadResult(self, gid: str):
+        self.downloads.pop(gid, None)
+        return "OK"
+
+    def rpc_purgeDownloadResult(self):
+        for gid in [gid for gid, download in self.downloads.items() if download.status in ("complete", "removed", "error")]:
+            del self.downloads[gid]
+        return "OK"
+
+    def rpc_forceShutdown(self):
+        return "OK"
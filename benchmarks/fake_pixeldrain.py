@@ -0,0 +1,50 @@
+import itertools
+import time
+
+from aiohttp import web
+
+
+class FakePixeldrain:
+    """Local Pixeldrain API sink: drains ``PUT /api/file/{name}`` bodies and records how fast they arrived."""
+
+    def __init__(self, host: str = "127.0.0.1"):
+        self.host = host
+        self.port = None
+        self.uploads = []
+        self.lists = []
+        self._ids = itertools.count(1)
+        self._runner = None
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api"
+
+    async def start(self):
+        app = web.Application(client_max_size=0)
+        app.router.add_put("/api/file/{name}", self._put_file)
+        app.router.add_post("/api/list", self._post_list)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _put_file(self, request):
+        start_time = time.perf_counter()
+        size = 0
+        async for chunk in request.content.iter_any():
+            size += len(chunk)
+        file_id = f"fake{next(self._ids)}"
+        self.uploads.append(
+            {"id": file_id, "name": request.match_info["name"], "size": size, "seconds": time.perf_counter() - start_time}
+        )
+        return web.json_response({"id": file_id}, status=201)
+
+    async def _post_list(self, request):
+        body = await request.json()
+        list_id = f"list{next(self._ids)}"
+        self.lists.append({"id": list_id, "title": body.get("title"), "files": len(body.get("files", []))})
+        return web.json_response({"success": True, "id": list_id}, status=201)
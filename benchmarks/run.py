@@ -0,0 +1,296 @@
+"""
+Offline benchmarks for the bot's hot paths.
+
+Runs a fake aria2 JSON-RPC websocket server and a fake Pixeldrain upload sink on
+localhost, then drives the real handlers of ``bot/plugins/download.py`` with a
+stubbed Telegram client. Results are written as JSON, compare two runs with
+``python -m benchmarks.compare old.json new.json``.
+
+Usage: python -m benchmarks.run [--jobs 1 10 100 1000] [--duration 15] [--out bench.json]
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+OWNER_ID = 1
+BENCH_CONFIG = f"""
+[required]
+api_id = "1"
+api_hash = "bench"
+bot_token = "bench"
+owner_id = "{OWNER_ID}"
+
+[general]
+download_dir = "downloads"
+pixeldrain_api_key = "bench"
+auto_mirror = false
+"""
+
+
+def rss_bytes() -> int:
+    """Current resident set size, falling back to the peak where /proc is unavailable."""
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def measure_loop_lag(samples: list, interval: float = 0.1):
+    loop = asyncio.get_running_loop()
+    while True:
+        start_time = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start_time - interval)
+
+
+@asynccontextmanager
+async def bench_client(workdir: str, fake_aria2, latency: float, name: str):
+    import aiohttp
+
+    from benchmarks.stubs import BenchClient
+    from bot import CONFIG_DICT
+    from bot.utils.aioaria import AioAria, Aria2Backend
+
+    backend = Aria2Backend(
+        url=fake_aria2.url,
+        download_dir=fake_aria2.download_dir,
+        session_file=os.path.join(workdir, f"{name}.session"),
+    )
+    await backend.initialize()
+    client = BenchClient(
+        copy.deepcopy(CONFIG_DICT),
+        AioAria([backend]),
+        db_path=os.path.join(workdir, f"{name}.db"),
+        config_path=os.path.join(workdir, "config.toml"),
+        latency=latency,
+    )
+    list_parallel = max(int(client.config["general"].get("list_upload_parallel", 4)), 2)
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=client.uploads.workers * list_parallel + 2))
+    probe_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=4))
+    await client.start(session, probe_session)
+    try:
+        yield client
+    finally:
+        await client.stop()
+        await session.close()
+        await probe_session.close()
+        await backend.client.close()
+        fake_aria2.downloads.clear()
+
+
+async def bench_status_loop(workdir: str, fake_aria2, jobs: int, duration: float, latency: float) -> dict:
+    """Add ``jobs`` concurrent downloads through ``/dl``, open a ``/status`` panel and measure the steady state."""
+
+    from bot.plugins.download import download_handler, status_handler
+    from bot.utils.aioaria import GLOBAL_OPTIONS
+
+    # Let every job run at once so the status loop sees N active downloads
+    GLOBAL_OPTIONS["max-concurrent-downloads"] = str(jobs)
+    rss_before = rss_bytes()
+
+    async with bench_client(workdir, fake_aria2, latency, f"status-{jobs}") as client:
+        start_time = time.perf_counter()
+        await asyncio.gather(
+            *(
+                download_handler(
+                    client,
+                    client.message(
+                        f"/dl http://bench.invalid/file{index}.bin", chat_id=-1000 - index, user_id=100 + index % 10
+                    ),
+                )
+                for index in range(jobs)
+            )
+        )
+        add_seconds = time.perf_counter() - start_time
+        await status_handler(client, client.message("/status", chat_id=OWNER_ID, user_id=OWNER_ID))
+
+        fake_aria2.reset_counters()
+        client.calls.clear()
+        lag = []
+        lag_task = asyncio.create_task(measure_loop_lag(lag))
+        await asyncio.sleep(duration)
+        lag_task.cancel()
+        rss = rss_bytes()
+
+        return {
+            "jobs": jobs,
+            "duration_s": duration,
+            "add_seconds": round(add_seconds, 4),
+            "add_per_s": round(jobs / add_seconds, 2) if add_seconds else None,
+            "rpc_round_trips_per_s": round(fake_aria2.round_trips / duration, 2),
+            "rpc_calls_per_s": {method: round(count / duration, 2) for method, count in sorted(fake_aria2.calls.items())},
+            "edits_per_s": round(client.calls["edit_message_text"] / duration, 2),
+            "edits_pending": len(client.editor.pending),
+            "loop_lag_ms": {
+                "mean": round(statistics.fmean(lag) * 1000, 3) if lag else None,
+                "max": round(max(lag) * 1000, 3) if lag else None,
+            },
+            "rss_bytes": rss,
+            "rss_delta_bytes": rss - rss_before,
+        }
+
+
+async def bench_upload(
+    workdir: str,
+    fake_aria2,
+    fake_pixeldrain,
+    size: int,
+    chunk_sizes: list,
+    readers: list,
+    repeat: int,
+    latency: float,
+) -> list:
+    """Upload one ``size`` bytes file through ``/pd`` for every reader backend and chunk size."""
+
+    from bot.plugins.download import pd_handler
+
+    file_path = os.path.join(workdir, "upload.bin")
+    with open(file_path, "wb") as f:
+        for _ in range(size // (1024 * 1024)):
+            f.write(os.urandom(1024 * 1024))
+        f.write(os.urandom(size % (1024 * 1024)))
+
+    results = []
+    async with bench_client(workdir, fake_aria2, latency, "upload") as client:
+        for reader in readers:
+            for chunk_size in chunk_sizes:
+                client.config["general"]["upload_reader"] = reader
+                client.config["general"]["upload_chunk_size"] = chunk_size
+                timings = []
+                rss_before = rss_bytes()
+                for _ in range(repeat):
+                    start_time = time.perf_counter()
+                    await pd_handler(client, client.message(f"/pd {file_path}", chat_id=OWNER_ID, user_id=OWNER_ID))
+                    await client.uploads.queue.join()
+                    timings.append(time.perf_counter() - start_time)
+
+                uploaded = fake_pixeldrain.uploads[-1]["size"] if fake_pixeldrain.uploads else 0
+                best = min(timings)
+                results.append(
+                    {
+                        "reader": reader,
+                        "chunk_size": chunk_size,
+                        "size": size,
+                        "uploaded": uploaded,
+                        "seconds": [round(timing, 4) for timing in timings],
+                        "best_mb_per_s": round(size / best / 1024**2, 2),
+                        "median_mb_per_s": round(size / statistics.median(timings) / 1024**2, 2),
+                        "rss_delta_bytes": rss_bytes() - rss_before,
+                    }
+                )
+                print(f"upload reader={reader} chunk={chunk_size}: {results[-1]['best_mb_per_s']} MB/s", file=sys.stderr)
+
+    return results
+
+
+async def run(args) -> dict:
+    from benchmarks.fake_aria2 import FakeAria2
+    from benchmarks.fake_pixeldrain import FakePixeldrain
+    from bot import DOWNLOAD_DIR, __version__
+    from bot.utils import pixeldrain
+
+    # Per-download INFO logs would dominate the measurements at N = 1000
+    logging.getLogger().setLevel(logging.WARNING)
+
+    fake_aria2 = FakeAria2(DOWNLOAD_DIR)
+    fake_pixeldrain = FakePixeldrain()
+    await fake_aria2.start()
+    await fake_pixeldrain.start()
+    pixeldrain.API_URL = fake_pixeldrain.api_url
+
+    report = {
+        "version": __version__,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "duration_s": args.duration,
+            "telegram_latency_s": args.latency,
+            "upload_size": args.upload_size,
+            "repeat": args.repeat,
+        },
+        "status_loop": [],
+        "upload": [],
+    }
+
+    try:
+        for jobs in args.jobs:
+            result = await bench_status_loop(args.workdir, fake_aria2, jobs, args.duration, args.latency)
+            report["status_loop"].append(result)
+            print(
+                f"status N={jobs}: {result['rpc_round_trips_per_s']} RPC/s, {result['edits_per_s']} edits/s, "
+                f"RSS {result['rss_bytes'] // 1024} KiB",
+                file=sys.stderr,
+            )
+
+        if args.upload_size:
+            report["upload"] = await bench_upload(
+                args.workdir,
+                fake_aria2,
+                fake_pixeldrain,
+                args.upload_size,
+                args.chunk_sizes,
+                args.readers,
+                args.repeat,
+                args.latency,
+            )
+    finally:
+        await fake_pixeldrain.stop()
+        await fake_aria2.stop()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for PDMirror-bot.")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 10, 100, 1000], help="Concurrent job counts.")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds to measure each job count.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated Telegram API round-trip in seconds.")
+    parser.add_argument("--upload-size", type=int, default=64 * 1024**2, help="Upload benchmark file size, 0 to skip.")
+    parser.add_argument(
+        "--chunk-sizes",
+        type=int,
+        nargs="+",
+        default=[64 * 1024, 256 * 1024, 1024**2, 4 * 1024**2],
+        help="UploadStreamReader chunk sizes to compare.",
+    )
+    parser.add_argument("--readers", nargs="+", default=["mmap", "aiofiles"], help="Upload reader backends.")
+    parser.add_argument("--repeat", type=int, default=3, help="Uploads per chunk size.")
+    parser.add_argument("--out", default=None, help="JSON output path, default bench-<version>.json.")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out) if args.out else None
+    with tempfile.TemporaryDirectory(prefix="pdmirror-bench-") as workdir:
+        args.workdir = workdir
+        with open(os.path.join(workdir, "config.toml"), "w") as f:
+            f.write(BENCH_CONFIG)
+        # The bot package reads config.toml and creates its download dir relative to the cwd
+        os.chdir(workdir)
+
+        report = asyncio.run(run(args))
+        os.chdir(REPO_ROOT)
+
+    out = out or os.path.join(REPO_ROOT, f"bench-{report['version']}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
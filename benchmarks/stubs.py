@@ -0,0 +1,119 @@
+import asyncio
+import itertools
+import logging
+from collections import Counter
+
+from bot.utils.acl import AccessControl
+from bot.utils.backpressure import BackpressureController
+from bot.utils.dedup import ContentIndex
+from bot.utils.editor import EditScheduler
+from bot.utils.jobs import JobManager
+from bot.utils.retention import RetentionManager
+from bot.utils.scheduler import FairScheduler
+from bot.utils.store import StateStore
+from bot.utils.uploads import UploadPool
+
+
+class StubChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+
+class StubUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.full_name = f"Bench user {user_id}"
+
+
+class StubMessage:
+    """Just enough of ``pyrogram.types.Message`` for the handlers in ``bot/plugins``."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, client, chat_id: int, user_id: int = None, text: str = ""):
+        self._client = client
+        self.id = next(self._ids)
+        self.chat = StubChat(chat_id)
+        self.from_user = StubUser(user_id) if user_id is not None else None
+        self.text = text
+        self.command = text.lstrip("/").split() if text.startswith("/") else []
+        self.reply_to_message = None
+        self.media = None
+
+    async def reply(self, text: str, **kwargs):
+        return await self._client.send_message(self.chat.id, text, reply_to_message_id=self.id)
+
+    async def edit_text(self, text: str, **kwargs):
+        return await self._client.edit_message_text(self.chat.id, self.id, text)
+
+
+class StubTelegram:
+    """
+    Stand-in for the Telegram side of ``BotClient``.
+
+    Every API call is counted and answered after ``latency`` seconds, roughly the
+    round-trip of a real Bot API request.
+    """
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def send_message(self, chat_id: int, text: str, reply_to_message_id: int = None, **kwargs):
+        self.calls["send_message"] += 1
+        await asyncio.sleep(self.latency)
+        return StubMessage(self, chat_id, text=text)
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str, **kwargs):
+        self.calls["edit_message_text"] += 1
+        await asyncio.sleep(self.latency)
+
+    async def delete_messages(self, chat_id: int, message_ids, **kwargs):
+        self.calls["delete_messages"] += 1
+        await asyncio.sleep(self.latency)
+
+
+class BenchClient(StubTelegram):
+    """``BotClient`` without Pyrogram: the real job, edit, scheduling and upload machinery on a stubbed Telegram."""
+
+    def __init__(self, config: dict, aioaria, db_path: str, config_path: str, latency: float = 0.05):
+        super().__init__(latency)
+        self.logger = logging.getLogger("Bench")
+        self.config = config
+        self.aioaria = aioaria
+        self.acl = AccessControl(config, path=config_path)
+        self.store = StateStore(db_path)
+        self.editor = EditScheduler(self)
+        self.jobs = JobManager(self)
+        self.scheduler = FairScheduler(self)
+        self.http_session = None
+        self.probe_session = None
+        self.dedup = ContentIndex(self)
+        self.uploads = UploadPool(
+            self,
+            workers=int(config["general"].get("upload_workers", 2)),
+            queue_size=int(config["general"].get("upload_queue_size", 32)),
+        )
+        self.backpressure = BackpressureController(self)
+        self.retention = RetentionManager(self)
+        self.status_messages = {}
+
+    def message(self, text: str, chat_id: int, user_id: int) -> StubMessage:
+        return StubMessage(self, chat_id, user_id, text)
+
+    async def start(self, http_session, probe_session=None):
+        self.http_session = http_session
+        self.probe_session = probe_session or http_session
+        self.editor.start()
+        self.aioaria.on_download_complete(self.jobs.complete)
+        self.jobs.on_finish(self.scheduler.on_finish)
+        self.jobs.start()
+        self.uploads.start()
+
+    async def stop(self):
+        for panel in self.status_messages.values():
+            panel.stop()
+        await self.jobs.stop()
+        await self.uploads.stop()
+        await self.editor.stop()
+        self.store.close()
@@ -4,25 +4,20 @@ import sys
 
 import tomli
 
+from bot.utils.logs import setup_logging
 
-__version__ = "0.1.3"
 
-# Setting up logging
-logging.basicConfig(
-    format="[%(asctime)s] %(name)s | %(levelname)s | %(message)s",
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
-logging.getLogger("pyrogram").setLevel(logging.ERROR)
-LOGGER = logging.getLogger("PDMirror_BOT")
+__version__ = "0.1.3"
 
 # Load config.toml
 with open("config.toml", "rb") as f:
     CONFIG_DICT = tomli.load(f)
 
+# Setting up logging, written to bot.log and stdout from a background thread
+LOG_LISTENER = setup_logging(CONFIG_DICT.get("logging", {}))
+logging.getLogger("pyrogram").setLevel(logging.ERROR)
+LOGGER = logging.getLogger("PDMirror_BOT")
+
 # Check if the required section of config.toml is filled
 if not all(CONFIG_DICT["required"].values()):
     LOGGER.error("Must filled all the required section of config.toml. Exiting.")
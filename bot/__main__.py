@@ -2,6 +2,7 @@ import asyncio
 
 from pyrogram import idle
 
+from bot import CONFIG_DICT
 from bot.bot_client import BotClient, LOGGER
 
 
@@ -16,4 +17,13 @@ async def main():
 
 
 if __name__ == "__main__":
+    if CONFIG_DICT["general"].get("uvloop", False):
+        try:
+            import uvloop
+
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            LOGGER.info("Using the uvloop event loop.")
+        except ImportError:
+            LOGGER.warning("general.uvloop is set but uvloop is not installed, using the default event loop.")
+
     asyncio.run(main())
@@ -1,10 +1,29 @@
 import asyncio
 
+import aiohttp
 from pyrogram import Client, raw
-from tinydb import TinyDB, Query
 
 from bot import CONFIG_DICT, LOGGER, __version__
+from bot.utils.acl import AccessControl
 from bot.utils.aioaria import AioAria
+from bot.utils.backpressure import BackpressureController
+from bot.utils.dedup import ContentIndex
+from bot.utils.editor import EditScheduler
+from bot.utils.jobs import JobManager
+from bot.utils.metrics import (
+    DOWNLOAD_SPEED,
+    JOBS,
+    UPDATE_QUEUE_DEPTH,
+    UPLOAD_BACKLOG_BYTES,
+    UPLOAD_QUEUE_DEPTH,
+    MetricsServer,
+)
+from bot.utils.profiler import LoopWatchdog
+from bot.utils.replay import ReplayStage
+from bot.utils.retention import RetentionManager
+from bot.utils.scheduler import FairScheduler
+from bot.utils.store import StateStore
+from bot.utils.uploads import UploadPool
 
 
 class BotClient(Client):
@@ -13,12 +32,55 @@ class BotClient(Client):
         self.logger.info("Initializing bot client.")
         self.aioaria = None
         self.config = CONFIG_DICT
-        self.db = TinyDB("db.json").table("bot_settings")
-        self.db_query = Query()
-        # Map of aria2 download GID -> (chat_id, message_id) for status messages
-        self.active_downloads = {}
-        # Map of user_id -> (chat_id, message_id, update_task) for status command messages
+        # Compiled user/chat allow-lists, reloaded when config.toml changes
+        self.acl = AccessControl(self.config)
+        # Bot state, jobs and upload results, in SQLite (WAL mode)
+        self.store = StateStore(self.config["general"].get("db_path", "bot.db"))
+        # Every message edit goes through here so edits are coalesced and rate limited
+        self.editor = EditScheduler(
+            self,
+            chat_rate=float(self.config["general"].get("edit_rate_private", 0.5)),
+            group_rate=float(self.config["general"].get("edit_rate_group", 0.25)),
+        )
+        # Owns every aria2 download GID and its status message, polled in one batch
+        self.jobs = JobManager(self)
+        # Hands out aria2 download slots fairly between users
+        self.scheduler = FairScheduler(self)
+        # Shared, pooled HTTP session for Pixeldrain uploads; created on start
+        self.http_session = None
+        # Small separate pool for short calls, so they never queue behind long transfers
+        self.probe_session = None
+        # Pixeldrain IDs of content we already uploaded, to skip re-uploading identical files
+        self.dedup = ContentIndex(self)
+        self.uploads = UploadPool(
+            self,
+            workers=int(self.config["general"].get("upload_workers", 2)),
+            queue_size=int(self.config["general"].get("upload_queue_size", 32)),
+        )
+        # Throttles and pauses aria2 when uploads fall behind or the disk runs low
+        self.backpressure = BackpressureController(self)
+        # Deletes already uploaded files from DOWNLOAD_DIR, least recently used first
+        self.retention = RetentionManager(self)
+        # Throttles and deduplicates the updates recovered after a restart
+        self.replay = ReplayStage(self)
+        # Map of user_id -> StatusPanel for /status messages
         self.status_messages = {}
+        # Optional Prometheus endpoint; the gauges below are read on every scrape and /stats
+        metrics_config = self.config.get("metrics", {})
+        self.metrics_server = (
+            MetricsServer(metrics_config.get("host", "127.0.0.1"), int(metrics_config.get("port", 9100)))
+            if metrics_config.get("enabled", False)
+            else None
+        )
+        # Logs event loop lag and the stack of callbacks blocking the loop; /profile sets the profiler
+        lag_threshold = float(self.config["general"].get("loop_lag_threshold", 0.1))
+        self.watchdog = LoopWatchdog(threshold=lag_threshold) if lag_threshold > 0 else None
+        self.profiler = None
+        JOBS.set_function(self._job_counts)
+        DOWNLOAD_SPEED.set_function(lambda: sum(job.download_speed for job in self.jobs.values()))
+        UPLOAD_QUEUE_DEPTH.set_function(self.uploads.queue.qsize)
+        UPLOAD_BACKLOG_BYTES.set_function(lambda: self.uploads.pending_bytes)
+        UPDATE_QUEUE_DEPTH.set_function(lambda: self.dispatcher.updates_queue.qsize())
 
         super().__init__(
             name="botclient",
@@ -29,45 +91,127 @@ class BotClient(Client):
         )
 
 
+    def _job_counts(self) -> dict:
+        queued = sum(len(queue) for queue in self.scheduler.waiting.values())
+        return {("active",): max(len(self.jobs) - queued, 0), ("queued",): queued}
+
+
+    async def _timed(self, phase: str, aw):
+        start_time = asyncio.get_event_loop().time()
+        result = await aw
+        elapsed = asyncio.get_event_loop().time() - start_time
+        self.logger.info(f"{phase} took {elapsed * 1000:.0f} ms.")
+        return result
+
+
     async def start(self):
-        await super().start()
-        await self.recover_state()
+        start_time = asyncio.get_event_loop().time()
+
+        # Telegram login and aria2 startup don't depend on each other
+        _, self.aioaria = await asyncio.gather(
+            self._timed("Telegram connect", super().start()),
+            self._timed(
+                "aria2 startup",
+                AioAria.initialize(
+                    session_file=self.config["general"].get("aria2_session", "aria2.session"),
+                    backends_config=self.config.get("aria2", []),
+                ),
+            ),
+        )
+        self.editor.start()
+        self.acl.start()
+        if self.watchdog:
+            self.watchdog.start()
 
-        self.aioaria = await AioAria.initialize()
+        self.aioaria.on_download_complete(self.jobs.complete)
+        self.jobs.restore()
+        self.jobs.on_finish(self.scheduler.on_finish)
+        self.jobs.on_finish(self.retention.on_finish)
+        await self.scheduler.adopt(self.jobs.values())
+        self.jobs.start()
 
-        bot_info = await self.get_me()
+        # Every worker may run a whole list upload, or a relay's GET and PUT, plus room for the list calls
+        list_parallel = max(int(self.config["general"].get("list_upload_parallel", 4)), 2)
+        # Uploads last as long as they need; only a stalled connection times out
+        self.http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.uploads.workers * list_parallel + 2, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=30,
+                sock_read=float(self.config["general"].get("transfer_idle_timeout", 300)),
+            ),
+        )
+        self.probe_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        self.uploads.start()
+        self.backpressure.start()
+        self.retention.start()
+        if self.config["general"].get("auto_mirror", False):
+            self.jobs.on_finish(self.uploads.mirror_job)
+            self.logger.info("Auto-mirror to Pixeldrain enabled.")
+        if self.metrics_server:
+            await self.metrics_server.start()
+
+        # Replayed updates need aria2 and the upload pool, so recovery runs once those are up
+        _, bot_info = await asyncio.gather(
+            self._timed("State recovery", self.recover_state()),
+            self.get_me(),
+        )
         self.logger.info(f"Bot is running version {__version__}")
         self.logger.info(f"Bot info : {bot_info.full_name} (@{bot_info.username})")
-    
+        self.logger.info(f"Bot ready in {(asyncio.get_event_loop().time() - start_time) * 1000:.0f} ms.")
+
     async def stop(self, block=True, keep_aria=False):
+        start_time = asyncio.get_event_loop().time()
         self.logger.info("Saving bot state.")
 
         state = await self.invoke(raw.functions.updates.GetState())
         value = {"pts": state.pts, "qts": state.qts, "date": state.date}
-        self.db.upsert({"name": "state", "value": value}, self.db_query.name == "state")
+        self.store.set_state("state", value)
 
         async def do_it():
             await self.terminate()
             await self.disconnect()
         
         if block:
-            await do_it()
+            await self._timed("Telegram disconnect", do_it())
         else:
             self.loop.create_task(do_it())
         
         self.logger.info("Shutting down bot client.")
 
+        await self.replay.stop()
+        await self.backpressure.stop()
+        await self.retention.stop()
+        await self.jobs.stop()
+        await self.uploads.stop()
+        await self.editor.stop()
+        await self.acl.stop()
+        if self.watchdog:
+            await self.watchdog.stop()
+        if self.profiler and self.profiler.running:
+            self.profiler.stop()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        if self.http_session:
+            await self.http_session.close()
+        if self.probe_session:
+            await self.probe_session.close()
+        self.store.close()
+
         if not keep_aria:
-            await self.aioaria.shutdown()
+            await self._timed("aria2 shutdown", self.aioaria.shutdown())
 
-        await asyncio.sleep(2.5)
+        self.logger.info(f"Shutdown took {(asyncio.get_event_loop().time() - start_time) * 1000:.0f} ms.")
 
         return self
     
 
     async def recover_state(self):
         try:
-            state = self.db.get(self.db_query.name == "state")
+            state = self.store.get_state("state")
         except Exception as e:
             self.logger.error("Failed to read saved state from DB", exc_info=True)
             return
@@ -76,7 +220,7 @@ class BotClient(Client):
             return
 
         self.logger.info("Recovering bot state.")
-        value = state.get("value", {}) or {}
+        value = state or {}
         pts = value.get("pts", 0)
         date = value.get("date", 0)
         prev_pts = None
@@ -90,7 +234,7 @@ class BotClient(Client):
             # Timeout guard
             if asyncio.get_event_loop().time() - start_time > max_duration:
                 self.logger.warning("recover_state timed out; removing saved state and aborting recovery.")
-                self.db.remove(self.db_query.name == "state")
+                self.store.delete_state("state")
                 break
 
             try:
@@ -107,7 +251,7 @@ class BotClient(Client):
                 self.logger.warning("GetDifference failed (attempt %s/%s). Retrying...", retry_count, max_retries, exc_info=True)
                 if retry_count >= max_retries:
                     self.logger.error("Max retries reached while recovering state; aborting and removing saved state.")
-                    self.db.remove(self.db_query.name == "state")
+                    self.store.delete_state("state")
                     break
                 # exponential backoff with cap
                 await asyncio.sleep(min(2 ** retry_count, 5))
@@ -115,7 +259,7 @@ class BotClient(Client):
 
             # Defensive handling of diff types and attributes
             if isinstance(diff, raw.types.updates.DifferenceEmpty):
-                self.db.remove(self.db_query.name == "state")
+                self.store.delete_state("state")
                 break
             if isinstance(diff, raw.types.updates.DifferenceTooLong):
                 # advance pts and try again
@@ -133,28 +277,31 @@ class BotClient(Client):
                 # stop if stuck on same pts
                 if prev_pts is not None and prev_pts == pts:
                     self.logger.warning("recover_state detected no progress (pts unchanged). Cleaning up saved state.")
-                    self.db.remove(self.db_query.name == "state")
+                    self.store.delete_state("state")
                     break
                 prev_pts = pts
             else:
                 new_state = getattr(diff, "state", None)
 
-            # enqueue new messages and other updates defensively
+            # hand new messages and other updates to the replay stage defensively
             for msg in getattr(diff, "new_messages", []) or []:
                 try:
                     pts_for_msg = getattr(new_state, "pts", pts) if new_state else pts
                     update = raw.types.UpdateNewMessage(message=msg, pts=pts_for_msg, pts_count=-1)
-                    self.dispatcher.updates_queue.put_nowait((update, users, chats))
+                    self.replay.add(update, users, chats)
                 except Exception:
                     self.logger.exception("Failed to enqueue UpdateNewMessage from recovered diff.")
 
             for upd in getattr(diff, "other_updates", []) or []:
                 try:
-                    self.dispatcher.updates_queue.put_nowait((upd, users, chats))
+                    self.replay.add(upd, users, chats)
                 except Exception:
                     self.logger.exception("Failed to enqueue other update from recovered diff.")
 
             if isinstance(diff, raw.types.updates.Difference):
                 # final snapshot reached; remove saved state
-                self.db.remove(self.db_query.name == "state")
+                self.store.delete_state("state")
                 break
+
+        # Replayed in the background and throttled, so the bot is ready before the backlog is through
+        self.replay.start()
@@ -1,13 +1,26 @@
 import asyncio
+import io
+import math
 import os
 import signal
 import sys
+import time
 
 from pyrogram import filters
 from pyrogram.types import Message
 
+from bot import LOG_LISTENER
 from bot.bot_client import BotClient
+from bot.utils import metrics
 from bot.utils.filters import AUTHORIZED_ONLY, OWNER_ONLY
+from bot.utils.logs import stop_logging
+from bot.utils.profiler import SamplingProfiler
+from bot.utils.tools import readable_bytes
+
+
+PROFILE_USAGE = "Usage : `/profile start [interval_ms]` or `/profile stop`"
+# Shortest sampling interval /profile accepts
+MIN_PROFILE_INTERVAL_MS = 1
 
 
 @BotClient.on_message(AUTHORIZED_ONLY & filters.command("start"))
@@ -31,7 +44,9 @@ async def restart_function(client: BotClient, message: Message):
     await message.reply("Restarting.")
 
     await client.stop(block=False, keep_aria=True)
-    
+    # atexit handlers don't run on exec, flush the log queue now
+    stop_logging(LOG_LISTENER)
+
     os.execv(sys.executable, [sys.executable, "-m", "bot"])
 
 
@@ -57,4 +72,75 @@ async def ping_function(client: BotClient, message: Message):
 
     client.logger.info(
         f"User {message.from_user.full_name} ({message.from_user.id}) pinged the bot with latency {latency:.2f} ms."
-    )
\ No newline at end of file
+    )
+
+
+@BotClient.on_message(OWNER_ONLY & filters.command("profile"))
+async def profile_function(client: BotClient, message: Message):
+    args = message.command[1:]
+    action = args[0] if args else ""
+    profiler = client.profiler
+
+    if action == "start":
+        if profiler and profiler.running:
+            await message.reply("Profiler is already running.")
+            return
+        try:
+            interval_ms = float(args[1]) if len(args) > 1 else 5
+        except ValueError:
+            interval_ms = math.nan
+        if not math.isfinite(interval_ms):
+            await message.reply(PROFILE_USAGE)
+            return
+        # A zero interval would busy-loop the sampler thread and starve the loop it measures
+        interval_ms = max(interval_ms, MIN_PROFILE_INTERVAL_MS)
+        client.profiler = SamplingProfiler(interval=interval_ms / 1000)
+        client.profiler.start()
+        await message.reply(f"Profiler started, sampling every {interval_ms:g} ms. Send `/profile stop` to get the report.")
+        client.logger.info("Sampling profiler started.")
+    elif action == "stop":
+        if not profiler or not profiler.running:
+            await message.reply("Profiler is not running.")
+            return
+        profiler.stop()
+        report = io.BytesIO(profiler.report().encode())
+        report.name = f"profile-{time.strftime('%Y%m%d-%H%M%S')}.txt"
+        await message.reply_document(report, caption=f"{profiler.samples} samples.")
+        client.logger.info(f"Sampling profiler stopped after {profiler.samples} samples.")
+    else:
+        await message.reply(PROFILE_USAGE)
+
+
+@BotClient.on_message(OWNER_ONLY & filters.command("stats"))
+async def stats_function(client: BotClient, message: Message):
+    jobs = metrics.JOBS.collect()
+    rpc_count, rpc_avg = metrics.ARIA2_RPC_SECONDS.summary()
+    upload_count, upload_avg = metrics.UPLOAD_SECONDS.summary()
+    edit_count, edit_avg = metrics.EDIT_SECONDS.summary()
+    _, lag_avg = metrics.LOOP_LAG_SECONDS.summary()
+    upload_bytes = metrics.UPLOAD_BYTES.total()
+    upload_time = upload_count * upload_avg
+
+    await message.reply(
+        "**Jobs**\n"
+        f"Active : {jobs.get(('active',), 0)} | Queued : {jobs.get(('queued',), 0)}\n"
+        f"Completed : {metrics.JOBS_FINISHED.get(result='complete'):.0f} | "
+        f"Failed : {metrics.JOBS_FINISHED.get(result='error'):.0f} | "
+        f"Cancelled : {metrics.JOBS_FINISHED.get(result='cancelled'):.0f}\n"
+        f"Download speed : {readable_bytes(metrics.DOWNLOAD_SPEED.collect().get((), 0))}/s\n\n"
+        "**aria2 RPC**\n"
+        f"Calls : {rpc_count} | Avg : {rpc_avg * 1000:.1f} ms\n\n"
+        "**Pixeldrain**\n"
+        f"Uploads : {upload_count} | Errors : {metrics.UPLOAD_ERRORS.total():.0f} | Avg : {upload_avg:.1f} s\n"
+        f"Sent : {readable_bytes(upload_bytes)}"
+        + (f" @ {readable_bytes(upload_bytes / upload_time)}/s\n\n" if upload_time else "\n\n")
+        + "**Telegram**\n"
+        f"Edits : {edit_count} | Avg : {edit_avg * 1000:.1f} ms | FloodWaits : {metrics.FLOOD_WAITS.total():.0f}\n"
+        f"Update queue : {metrics.UPDATE_QUEUE_DEPTH.collect().get((), 0)} | "
+        f"Upload queue : {metrics.UPLOAD_QUEUE_DEPTH.collect().get((), 0)}"
+        + (
+            f"\nLoop lag : avg {lag_avg * 1000:.1f} ms | max {client.watchdog.max_lag * 1000:.0f} ms"
+            if client.watchdog
+            else ""
+        )
+    )
@@ -1,229 +1,481 @@
 import asyncio
+import base64
+import fnmatch
 import os
+from pathlib import Path
 
 from aioaria2 import Aria2rpcException
 from aiopath import AsyncPath
 from pyrogram import filters
-from pyrogram.types import Message
+from pyrogram.types import CallbackQuery, Message
 
+from bot import DOWNLOAD_DIR
 from bot.bot_client import BotClient
+from bot.utils.archive import members_from_directory, members_from_paths
+from bot.utils.batch import DownloadBatch
 from bot.utils.filters import AUTHORIZED_ONLY
-from bot.utils.tools import format_duration_us, readable_bytes
-from bot.utils.pixeldrain import upload_file_to_pixeldrain
+from bot.utils.jobs import DownloadJob
+from bot.utils.pixeldrain import IterableStreamReader
+from bot.utils.relay import probe_url, relay_chunks
+from bot.utils.status import StatusPanel
+from bot.utils.uploads import ListUploadTask, UploadTask
+
+
+# Largest replied-to link list, torrent or metalink /dl reads
+MAX_LINK_FILE_SIZE = 10 * 1024 * 1024
+# aria2 method adding each kind of replied-to download file
+LINK_FILE_METHODS = {".torrent": "addTorrent", ".metalink": "addMetalink", ".meta4": "addMetalink"}
+# Files /cancel deletes at once
+CANCEL_DELETE_CONCURRENCY = 16
 
 
 @BotClient.on_message(AUTHORIZED_ONLY & filters.command(["download", "dl"]))
 async def download_handler(client: BotClient, message: Message):
-    if len(message.command) < 2:
-        await message.reply("Must provide a download link.")
+    args = message.command[1:]
+    # --stream: upload to Pixeldrain while aria2 is still downloading
+    stream = any(arg in ("--stream", "-s") for arg in args)
+    args = [arg for arg in args if arg not in ("--stream", "-s")]
+
+    document = message.reply_to_message.document if message.reply_to_message else None
+    extension = os.path.splitext(document.file_name or "")[1].lower() if document else ""
+    if extension != ".txt" and extension not in LINK_FILE_METHODS:
+        document = None
+    if document and document.file_size > MAX_LINK_FILE_SIZE:
+        await message.reply(f"`{document.file_name}` is too large, the limit is {MAX_LINK_FILE_SIZE // 1024**2} MB.")
+        return
+
+    file_call = None
+    if document:
+        data = (await client.download_media(message.reply_to_message, in_memory=True)).getvalue()
+        if extension == ".txt":
+            # One link per line, blank lines and # comments skipped
+            lines = (line.strip() for line in data.decode("utf-8", "replace").splitlines())
+            args += [line for line in lines if line and not line.startswith("#")]
+        else:
+            file_call = (LINK_FILE_METHODS[extension], document.file_name, base64.b64encode(data).decode())
+
+    if not args and not file_call:
+        await message.reply("Must provide a download link, or reply to a .txt link list, torrent or metalink file.")
         return
 
-    url = message.command[1]
-    download_gid = await client.aioaria.client.addUri([url])
+    if len(args) > 1 or file_call:
+        if stream:
+            await message.reply("Upload while downloading only supports a single link.")
+            return
+        await batch_download(client, message, args, file_call)
+        return
+
+    url = args[0]
+    if stream and not url.startswith(("http://", "https://", "ftp://")):
+        await message.reply("Upload while downloading only supports HTTP(S) and FTP links.")
+        return
 
-    client.logger.info(f"Added download GID : {download_gid} for URL : {url}")
+    # Relayed links are downloads too, so the quotas apply before either path
+    user_id = message.from_user.id if message.from_user else None
+    quota_error = client.scheduler.check(user_id, message.chat.id)
+    if quota_error:
+        await message.reply(quota_error)
+        return
+
+    relay = stream or client.config["general"].get("auto_mirror", False)
+    # One HEAD request serves both the relay decision and the disk space check, when either needs it
+    probe = relay or await client.retention.needs_size()
+    size, file_name = await probe_download(client, url) if probe else (None, None)
+
+    # Files headed to Pixeldrain anyway skip aria2 and disk entirely when they are small enough
+    if relay and await relay_to_pixeldrain(
+        client, message, url, size, file_name
+    ):
+        return
+
+    # Evict uploaded files first if the download would not fit otherwise
+    space_error = await client.retention.ensure_space(size)
+    if space_error:
+        await message.reply(space_error)
+        return
+
+    # Added paused; the fair-share scheduler starts it when it is this user's turn
+    options = {"pause": "true"}
+    if stream:
+        options["stream-piece-selector"] = "inorder"
+    download_gid = await client.aioaria.add_uri([url], options)
+
+    client.logger.info(f"Added download GID : {download_gid} for URL : {url}", extra={"gid": download_gid})
 
     status_message = await message.reply(f"Download added, GID : `{download_gid}`")
-    # Register status message so other handlers (cancel) can update it
-    client.active_downloads[download_gid] = (status_message.chat.id, status_message.id)
-
-    last_status_message = ""
-    last_update_time = 0
-    start_time = asyncio.get_event_loop().time()
-
-    while True:
-        await asyncio.sleep(1)
-
-        try:
-            download = await client.aioaria.client.tellStatus(download_gid)
-        except Aria2rpcException as e:
-            # GID disappeared (likely cancelled/removed) — stop polling and notify
-            client.logger.info(f"GID {download_gid} not found during status poll: {e}")
-            # Only update the status message if it's still registered (cancel handler may have already edited+removed it)
-            mapping = client.active_downloads.pop(download_gid, None)
-            if mapping:
-                chat_id, msg_id = mapping
-                try:
-                    await client.edit_message_text(chat_id, msg_id, f"Download GID `{download_gid}` not found (cancelled or removed).")
-                except Exception:
-                    pass
-            break
-
-        # files may be missing if status is incomplete/removed — guard access
-        files = download.get("files") or []
-        filename = os.path.basename(files[0].get("path")) if files and files[0].get("path") else "unknown"
-        completed_length = int(download.get("completedLength", 0))
-        total_length = int(download.get("totalLength", 0))
-        download_speed = int(download.get("downloadSpeed", 0))
-        try:
-            eta = ((total_length - completed_length) / download_speed) * 1_000_000
-        except ZeroDivisionError:
-            eta = 0
-
-        if download["status"] == "complete":
-            status = f"Download completed.\n{filename}"
-            if last_status_message != status:
-                await status_message.edit(status)
-                client.active_downloads.pop(download_gid, None)
-                await client.aioaria.client.removeDownloadResult(download_gid)
-                break
+    # Hand the GID over to the job manager, which polls and edits the status message
+    job = DownloadJob(
+        download_gid,
+        status_message.chat.id,
+        status_message.id,
+        user_id=user_id,
+        url=url,
+        stream=stream,
+    )
+    client.jobs.add(job)
+    await client.scheduler.submit(job)
+
+    if stream:
+        client.uploads.stream_job(job)
+
+
+async def batch_download(client: BotClient, message: Message, links: list[str], file_call: tuple = None):
+    """Add many downloads with one aria2 round-trip and track them on a single status message."""
+
+    user_id = message.from_user.id if message.from_user else None
+    count = len(links) + (1 if file_call else 0)
+    quota_error = client.scheduler.check(user_id, message.chat.id, count)
+    if quota_error:
+        await message.reply(quota_error)
+        return
+
+    # Added paused; the fair-share scheduler starts each when it is this user's turn
+    options = {"pause": "true"}
+    calls = [("addUri", [link], options) for link in links]
+    labels = list(links)
+    if file_call:
+        method, file_name, data = file_call
+        calls.append((method, data, [], options) if method == "addTorrent" else (method, data, options))
+        labels.append(file_name)
+
+    status_message = await message.reply(f"Adding {count} download(s)...")
+    results = await client.aioaria.add_many(calls)
 
-        now = asyncio.get_event_loop().time()
-        if now - last_update_time >= 10:
-            elapsed_usec = int((now - start_time) * 1_000_000)
-            status = (
-                f"Name : {filename}\n"
-                f"Elapsed : {format_duration_us(elapsed_usec)}\n"
-                f"Downloaded : {readable_bytes(completed_length)} of {readable_bytes(total_length)}\n"
-                f"ETA : {format_duration_us(eta)} @ {readable_bytes(download_speed)}/s\n"
-                f"GID : `{download_gid}`"
+    batch = DownloadBatch(client, status_message.chat.id, status_message.id)
+    jobs = []
+    for index, (label, result) in enumerate(zip(labels, results)):
+        if isinstance(result, Exception):
+            batch.reject(label, str(result))
+            continue
+        # addMetalink returns a GID per file of the metalink
+        for gid in result if isinstance(result, list) else [result]:
+            jobs.append(
+                DownloadJob(
+                    gid,
+                    status_message.chat.id,
+                    status_message.id,
+                    user_id=user_id,
+                    url=label if index < len(links) else None,
+                )
             )
-            if last_status_message != status:
-                await status_message.edit(status)
-                last_status_message = status
-                last_update_time = now
+
+    # A lone download keeps the usual per-job status message
+    if len(jobs) > 1 or batch.rejected:
+        for job in jobs:
+            batch.add(job)
+
+    for job in jobs:
+        client.jobs.add(job)
+    await client.scheduler.submit(*jobs)
+
+    if jobs and jobs[0].batch is None:
+        client.editor.edit(status_message.chat.id, status_message.id, f"Download added, GID : `{jobs[0].gid}`")
+    else:
+        batch.refresh()
+    client.logger.info(f"Added {len(jobs)} download(s) from {count} link(s), {len(batch.rejected)} rejected.")
+
+
+async def probe_download(client: BotClient, url: str) -> tuple:
+    """HEAD a direct link for its size and file name. Returns ``(None, None)`` when unknown."""
+
+    if not url.startswith(("http://", "https://")):
+        return None, None
+
+    try:
+        # Own pool, so a probe never waits behind running uploads
+        return await probe_url(client.probe_session, url)
+    except Exception as e:
+        client.logger.warning(f"HEAD failed for {url}, size unknown : {e!r}")
+        return None, None
+
+
+async def relay_to_pixeldrain(client: BotClient, message: Message, url: str, size: int, file_name: str) -> bool:
+    """Pipe a small direct link straight into a Pixeldrain upload. Returns False if aria2 should handle it."""
+
+    relay_max_size = int(client.config["general"].get("relay_max_size", 256 * 1024 * 1024))
+    if not relay_max_size or not size or size > relay_max_size:
+        return False
+    idle_timeout = float(client.config["general"].get("transfer_idle_timeout", 300))
+
+    await client.uploads.submit(
+        UploadTask(
+            None,
+            message.chat.id,
+            reply_to_message_id=message.id,
+            file_name=file_name,
+            open_reader=lambda callback: IterableStreamReader(
+                relay_chunks(client.http_session, url, client.uploads.chunk_size, idle_timeout),
+                total=size,
+                callback=callback,
+            ),
+        )
+    )
+    client.logger.info(f"Relaying {url} ({size} bytes) directly to Pixeldrain.")
+    return True
 
 
 @BotClient.on_message(AUTHORIZED_ONLY & filters.command("pd"))
 async def pd_handler(client: BotClient, message: Message):
-    if len(message.command) < 2:
-        await message.reply("Input args")
+    reply = message.reply_to_message
+    media = getattr(reply, reply.media.value, None) if reply and reply.media else None
+    if media and getattr(media, "file_size", None):
+        await telegram_pd_handler(client, message, reply, media)
         return
-    
-    file_path = message.command[1]
-    file_name = os.path.basename(file_path)
 
-    if not os.path.exists(file_path):
-        await message.reply("File not exists.")
+    args = message.command[1:]
+    # --list: upload the files of a directory or GID separately, grouped in a Pixeldrain list
+    as_list = "--list" in args
+    args = [arg for arg in args if arg != "--list"]
+
+    if not args:
+        await message.reply("Input args, or reply to a file.")
         return
 
-    status_message = await message.reply("Uploading to pixeldrain.")
+    file_path = args[0]
+    file_name = os.path.basename(file_path.rstrip(os.sep))
 
-    link = await upload_file_to_pixeldrain(
-        file_path=file_path,
-        file_name=file_name,
-        api_key=client.config["general"]["pixeldrain_api_key"],
-        message=status_message
-    )
+    if os.path.isdir(file_path) and as_list:
+        paths = await asyncio.to_thread(
+            lambda: sorted(str(path) for path in Path(file_path).rglob("*") if path.is_file())
+        )
+        task = ListUploadTask(paths, message.chat.id, file_name, reply_to_message_id=message.id)
+    elif os.path.isdir(file_path):
+        # Upload the directory as a tar generated on the fly
+        members = await asyncio.to_thread(members_from_directory, file_path)
+        task = client.uploads.archive_task(members, f"{file_name}.tar", message.chat.id, message.id)
+    elif os.path.exists(file_path):
+        task = UploadTask(file_path, message.chat.id, reply_to_message_id=message.id, file_name=file_name)
+    else:
+        task = await gid_upload_task(client, message, file_path, as_list)
+        if task is None:
+            await message.reply("File not exists.")
+            return
 
-    await status_message.edit(f"Upload complete.\n{link}")
-    client.logger.info(f"Uploaded {file_path} to Pixeldrain: {link}")
+    if client.uploads.queue.full():
+        await message.reply("Upload queue is full, waiting for a free slot.")
+
+    await client.uploads.submit(task)
+
+
+async def gid_upload_task(client: BotClient, message: Message, download_gid: str, as_list: bool = False):
+    """Build the upload for the files of an aria2 GID, archiving multi-file downloads unless ``as_list``."""
+
+    try:
+        download = await client.aioaria.call("tellStatus", download_gid, ["gid", "dir", "files", "bittorrent"])
+    except Aria2rpcException:
+        return None
+
+    job = DownloadJob(download_gid, message.chat.id, message.id)
+    job.update(download)
+    paths = job.selected_paths
+    if not paths:
+        return None
+
+    if len(paths) == 1:
+        return UploadTask(paths[0], message.chat.id, reply_to_message_id=message.id, gid=download_gid)
+
+    if as_list:
+        return ListUploadTask(paths, message.chat.id, job.filename, reply_to_message_id=message.id, gid=download_gid)
+
+    members = await asyncio.to_thread(members_from_paths, paths, job.dir or DOWNLOAD_DIR)
+    return client.uploads.archive_task(members, f"{job.filename}.tar", message.chat.id, message.id, gid=download_gid)
+
+
+async def telegram_pd_handler(client: BotClient, message: Message, reply: Message, media):
+    """Relay a Telegram file straight into the Pixeldrain upload, without writing it to disk."""
+
+    file_name = getattr(media, "file_name", None) or f"{reply.media.value}_{reply.id}"
+    if len(message.command) > 1:
+        file_name = " ".join(message.command[1:])
+
+    if client.uploads.queue.full():
+        await message.reply("Upload queue is full, waiting for a free slot.")
+
+    await client.uploads.submit(
+        UploadTask(
+            None,
+            message.chat.id,
+            reply_to_message_id=message.id,
+            file_name=file_name,
+            open_reader=lambda callback: IterableStreamReader(
+                client.stream_media(reply), total=media.file_size, callback=callback
+            ),
+        )
+    )
+    client.logger.info(f"Queued Telegram file {file_name} ({media.file_size} bytes) for Pixeldrain.")
 
 
 @BotClient.on_message(AUTHORIZED_ONLY & filters.command(["cancel", "c"]))
 async def cancel_download_handler(client: BotClient, message: Message):
-    if len(message.command) < 2:
-        await message.reply("Must provide a download GID to cancel.")
+    patterns = message.command[1:]
+    if not patterns:
+        await message.reply("Must provide download GIDs, `all`, `mine` or a name pattern to cancel.")
         return
 
-    download_gid = message.command[1]
-    
-    if client.active_downloads.get(download_gid) is None:
-        await message.reply(f"No active download with GID#`{download_gid}` found.")
+    user_id = message.from_user.id if message.from_user else None
+    jobs = select_jobs(client, patterns, user_id, message.chat.id)
+    if not jobs:
+        await message.reply(f"No active download matching `{' '.join(patterns)}` found.")
         return
-    
-    files = await client.aioaria.client.getFiles(download_gid)
 
-    try:
-        await client.aioaria.client.remove(download_gid)
-        await client.aioaria.client.removeDownloadResult(download_gid)
-    except Aria2rpcException as e:
-        await message.reply(f"Failed to remove GID#`{download_gid}`")
-        client.logger.error(f"Failed to remove GID#{download_gid} : {e.msg}")
+    # getFiles before remove, so the paths are known even for jobs never polled for them
+    calls = []
+    for job in jobs:
+        calls += [("getFiles", job.gid), ("remove", job.gid)]
+    results = await client.aioaria.multicall(calls)
+
+    cancelled = []
+    failed = []
+    for index, job in enumerate(jobs):
+        files, removed = results[index * 2:index * 2 + 2]
+        if isinstance(removed, Exception):
+            failed.append(job.gid)
+            client.logger.error(f"Failed to remove GID#{job.gid} : {removed}", extra=job.log_extra)
+            continue
+
+        # If we have a status message registered for this gid, update it to "Cancelled"
+        client.jobs.cancel(job.gid, f"Cancelled download GID#`{job.gid}`.", flush=False)
+        files = job.files if isinstance(files, Exception) else files
+        # Files of remote aria2 backends are not on this machine
+        local = client.aioaria.resolve(job.gid)[0].is_local
+        cancelled.append((job, [file_info["path"] for file_info in files if local and file_info.get("path")]))
+
+    client.jobs.flush()
+    # Hand the freed slots to the next users in line
+    await client.scheduler.dispatch()
+
+    # Active downloads stop asynchronously; their files are only safe to delete once aria2 let go of them
+    await remove_results(client, [job.gid for job, _ in cancelled])
+
+    deleted = set(
+        await delete_files(
+            client, [temp_file for _, paths in cancelled for path in paths for temp_file in (path, f"{path}.aria2")]
+        )
+    )
+    for job, paths in cancelled:
+        names = [
+            os.path.basename(temp_file)
+            for path in paths
+            for temp_file in (path, f"{path}.aria2")
+            if temp_file in deleted
+        ]
+        client.logger.info(f"Cancelled download GID : {job.gid}, deleted {names}", extra=job.log_extra)
+
+    if len(jobs) == 1 and not failed:
+        await message.reply(f"GID#`{jobs[0].gid}` cancelled.")
         return
 
-    # If we have a status message registered for this gid, update it to "Cancelled"
-    mapping = client.active_downloads.pop(download_gid, None)
-    if mapping:
-        chat_id, msg_id = mapping
-        try:
-            await client.edit_message_text(chat_id, msg_id, f"Cancelled download GID#`{download_gid}`.")
-        except Exception:
-            # ignore edit errors
-            pass
-    
-    if files:
-        for file_info in files:
-            file = AsyncPath(file_info.get("path"))
-            temp_files = [AsyncPath(file), AsyncPath(f"{file}.aria2")]
-            for temp_file in temp_files:
-                if await temp_file.exists():
-                    await temp_file.unlink()
-        client.logger.info(f"Deleted {[temp_file.name for temp_file in temp_files]} from GID#{download_gid}")
-
-    client.logger.info(f"Cancelled download GID : {download_gid}")
-    await message.reply(f"GID#`{download_gid}` cancelled.")
+    text = f"Cancelled {len(cancelled)} download(s), deleted {len(deleted)} file(s)."
+    if failed:
+        text += f"\nFailed to remove ({len(failed)}) : " + ", ".join(f"`{gid}`" for gid in failed[:20])
+    await message.reply(text)
+
+
+def select_jobs(client: BotClient, patterns: list[str], user_id: int, chat_id: int) -> list[DownloadJob]:
+    """
+    Jobs matching any of ``patterns``: a GID, ``all``, ``mine``, or a glob over the download name.
+
+    ``all`` and globs only match the sender's own jobs, unless the sender is the owner.
+    """
+    owner = user_id if user_id is not None else chat_id
+    is_owner = user_id is not None and client.acl.is_owner(user_id)
+    selected = []
+    for job in client.jobs.values():
+        name = job.filename.lower()
+        own = client.scheduler.owner(job) == owner
+        for pattern in patterns:
+            if (
+                pattern == job.gid
+                or (pattern == "mine" and own)
+                or ((own or is_owner) and (pattern == "all" or fnmatch.fnmatchcase(name, pattern.lower())))
+            ):
+                selected.append(job)
+                break
+    return selected
+
+
+async def remove_results(client: BotClient, gids: list[str], attempts: int = 20, delay: float = 0.25):
+    """Drop the download results of removed GIDs, retrying while aria2 is still stopping them."""
+
+    for _ in range(attempts):
+        if not gids:
+            return
+        results = await client.aioaria.multicall([("removeDownloadResult", gid) for gid in gids])
+        gids = [gid for gid, result in zip(gids, results) if isinstance(result, Exception)]
+        if gids:
+            await asyncio.sleep(delay)
+
+    client.logger.warning(f"aria2 did not finish removing {len(gids)} download(s) : {', '.join(gids[:20])}")
+
+
+async def delete_files(client: BotClient, paths: list[str], concurrency: int = CANCEL_DELETE_CONCURRENCY) -> list[str]:
+    """Delete the existing ``paths``, ``concurrency`` at a time. Returns the deleted paths."""
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def unlink(path: str):
+        async with semaphore:
+            try:
+                await AsyncPath(path).unlink()
+            except FileNotFoundError:
+                return None
+            except OSError as e:
+                client.logger.warning(f"Failed to delete {path} : {e}")
+                return None
+        return path
+
+    return [path for path in await asyncio.gather(*(unlink(path) for path in paths)) if path]
+
 
 @BotClient.on_message(AUTHORIZED_ONLY & filters.command("status"))
 async def status_handler(client: BotClient, message: Message):
     user_id = message.from_user.id
     chat_id = message.chat.id
-    
-    # Cancel any existing status update task for this user and delete old message
-    if user_id in client.status_messages:
-        old_chat_id, old_msg_id, old_task = client.status_messages[user_id]
-        if old_task and not old_task.done():
-            old_task.cancel()
-        # Delete the old status message if it's in the same chat
-        if old_chat_id == chat_id:
+
+    # Replace this user's previous panel, deleting it if it's in the same chat
+    old_panel = client.status_messages.pop(user_id, None)
+    if old_panel:
+        old_panel.stop()
+        if old_panel.chat_id == chat_id:
+            client.editor.discard(old_panel.chat_id, old_panel.message_id)
             try:
-                await client.delete_messages(chat_id, old_msg_id)
+                await client.delete_messages(chat_id, old_panel.message_id)
             except Exception as e:
                 client.logger.debug(f"Failed to delete old status message: {e}")
-    
-    # Create initial status message
+
     status_msg = await message.reply("📥 Fetching download status...")
-    
-    # Create update task
-    async def update_status():
-        try:
-            last_update_count = 0
-            while True:
-                await asyncio.sleep(5)  # Update every 5 seconds
-                
-                try:
-                    # Get all active downloads
-                    downloads = await client.aioaria.client.tellActive()
-                except Exception as e:
-                    client.logger.warning(f"Failed to fetch active downloads: {e}")
-                    try:
-                        await status_msg.edit_text(f"❌ Error fetching downloads: {str(e)[:50]}")
-                    except Exception:
-                        pass
-                    continue
-                
-                if not downloads:
-                    # No active downloads; exit gracefully
-                    try:
-                        await status_msg.edit_text("✅ No active downloads.")
-                    except Exception:
-                        pass
-                    break
-                
-                # If download count changed, clean up task from mapping
-                if len(downloads) != last_update_count:
-                    last_update_count = len(downloads)
-                
-                # Build status text
-                now = asyncio.get_event_loop().time()
-                status_lines = [
-                    f"📥 **Active Downloads** [{len(downloads)}]",
-                    f"⏰ Last updated: <t:{int(now)}:R>\n"
-                ]
-                
-                total_completed = 0
-                total_size = 0
-                
-                for idx, dl in enumerate(downloads, 1):
-                    gid = dl.get("gid", "unknown")
-                    files = dl.get("files") or []
-                    filename = os.path.basename(files[0].get("path")) if files and files[0].get("path") else "unknown"
-                    completed = int(dl.get("completedLength", 0))
-                    total = int(dl.get("totalLength", 0))
-                    speed = int(dl.get("downloadSpeed", 0))
-                    
-                    total_completed += completed
-                    total_size += total
-                    
-                    try:
-                        eta = ((total - completed) / speed) * 1_000_000 if speed > 0
+
+    # Progress comes from the job manager's cache, so panels cost no extra RPC
+    panel = StatusPanel(client, chat_id, status_msg.id, user_id)
+    client.status_messages[user_id] = panel
+    panel.start()
+
+
+@BotClient.on_callback_query(AUTHORIZED_ONLY & filters.regex(r"^batch\|"))
+async def batch_callback_handler(client: BotClient, query: CallbackQuery):
+    batch = client.jobs.batches.get((query.message.chat.id, query.message.id))
+    if batch is None:
+        await query.answer("This batch has finished.")
+        return
+
+    batch.toggle()
+    await query.answer()
+
+
+@BotClient.on_callback_query(AUTHORIZED_ONLY & filters.regex(r"^status\|"))
+async def status_callback_handler(client: BotClient, query: CallbackQuery):
+    _, action, value = query.data.split("|", 2)
+    panel = next(
+        (
+            panel
+            for panel in client.status_messages.values()
+            if panel.chat_id == query.message.chat.id and panel.message_id == query.message.id
+        ),
+        None,
+    )
+    if panel is None:
+        await query.answer("This status panel has expired, send /status again.")
+        return
+
+    panel.handle(action, value)
+    await query.answer()
@@ -0,0 +1,12 @@
+from pyrogram import filters
+from pyrogram.types import Message
+
+from bot.bot_client import BotClient
+from bot.utils.filters import AUTHORIZED_ONLY
+
+
+# Group -1 runs before the command handlers and doesn't stop them
+@BotClient.on_message(AUTHORIZED_ONLY & filters.regex(r"^/"), group=-1)
+async def record_command(client: BotClient, message: Message):
+    # Indexed so updates replayed after a crash don't run the same command twice
+    client.replay.record(message)
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import os
+
+import tomli
+
+
+class AccessRules:
+    """Immutable snapshot of who may use the bot, compiled once from the config."""
+
+    __slots__ = ("owner_id", "users", "chats")
+
+    def __init__(self, config: dict):
+        users_config = config.get("users", {})
+        self.owner_id = int(config["required"]["owner_id"])
+        # Accept both the plural keys and the singular ones used by older sample configs
+        self.users = frozenset(
+            map(int, (users_config.get("authorized_users") or users_config.get("authorized_user") or "").split())
+        ) | {self.owner_id}
+        self.chats = frozenset(
+            map(int, (users_config.get("authorized_chats") or users_config.get("authorized_chat") or "").split())
+        )
+
+
+class AccessControl:
+    """
+    O(1) access checks for the message filters.
+
+    ``config.toml`` is watched by mtime and the rules are rebuilt and swapped in one
+    assignment when it changes, so users can be added without a restart.
+    """
+
+    def __init__(self, config: dict, path: str = "config.toml", interval: float = 5):
+        self.logger = logging.getLogger("AccessControl")
+        self.path = path
+        self.interval = interval
+        self.rules = AccessRules(config)
+        self._mtime = self._stat()
+        self._task = None
+
+    def is_owner(self, user_id: int) -> bool:
+        return user_id == self.rules.owner_id
+
+    def is_authorized(self, user_id: int, chat_id: int) -> bool:
+        rules = self.rules
+        return user_id in rules.users or chat_id in rules.chats
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self) -> bool:
+        """Rebuild the rules from disk. The old rules stay in place if the file is invalid."""
+
+        try:
+            with open(self.path, "rb") as f:
+                rules = AccessRules(tomli.load(f))
+        except Exception:
+            self.logger.error(f"Failed to reload access rules from {self.path}, keeping the old ones.", exc_info=True)
+            return False
+
+        self.rules = rules
+        self.logger.info(f"Reloaded access rules : {len(rules.users)} user(s), {len(rules.chats)} chat(s).")
+        return True
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            mtime = self._stat()
+            if mtime is not None and mtime != self._mtime:
+                self._mtime = mtime
+                self.reload()
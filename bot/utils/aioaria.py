@@ -1,20 +1,191 @@
 import asyncio
 import logging
 import os
+import shlex
+import shutil
+from urllib.parse import urlparse
 
 from aioaria2 import Aria2WebsocketClient
 from aioaria2.exceptions import Aria2rpcException
 
 from bot import DOWNLOAD_DIR
+from .metrics import ARIA2_RPC_SECONDS
 from .tools import run_command
 
 
+RPC_URL = "http://localhost:6800/jsonrpc"
+
+GLOBAL_OPTIONS = {
+    "allow-overwrite": "true",
+    "auto-file-renaming": "true",
+    "bt-enable-lpd": "true",
+    "bt-remove-unselected-file": "true",
+    "check-certificate": "false",
+    "content-disposition-default-utf8": "true",
+    "continue": "true",
+    "disk-cache": "32M",
+    "follow-torrent": "mem",
+    "http-accept-gzip": "true",
+    "max-concurrent-downloads": "3",
+    "max-connection-per-server": "10",
+    "max-file-not-found": "0",
+    "max-overall-download-limit": "0",
+    "max-overall-upload-limit": "1K",
+    "max-tries": "20",
+    "min-split-size": "10M",
+    "reuse-uri": "true",
+    "rpc-max-request-size": "1024M",
+    "seed-time": "0",
+    "split": "10",
+    "summary-interval": "0",
+    "user-agent": "Wget/1.12"
+}
+
+
+def _parse_multicall(results) -> list:
+    parsed = []
+    for result in results:
+        if isinstance(result, list) and result:
+            parsed.append(result[0])
+        else:
+            fault = result.get("faultString", "unknown error") if isinstance(result, dict) else result
+            parsed.append(Aria2rpcException(fault))
+    return parsed
+
+
+class Aria2Backend:
+    """One aria2 daemon: its RPC endpoint, secret, download directory and session file."""
+
+    def __init__(
+        self,
+        name: str = "",
+        url: str = RPC_URL,
+        secret: str = None,
+        download_dir: str = DOWNLOAD_DIR,
+        session_file: str = "aria2.session",
+    ):
+        self.logger = logging.getLogger("AioAria")
+        self.name = name
+        self.url = url
+        self.secret = secret or None
+        self.download_dir = os.path.abspath(download_dir)
+        self.session_file = os.path.abspath(session_file)
+        self.client: Aria2WebsocketClient = None
+
+    @property
+    def is_local(self) -> bool:
+        return urlparse(self.url).hostname in ("localhost", "127.0.0.1", "::1")
+
+    def namespace(self, gid: str) -> str:
+        """Bot-wide GID for a GID of this daemon. The default backend keeps plain GIDs."""
+
+        return f"{self.name}:{gid}" if self.name else gid
+
+    async def _connect(self, timeout: float = 0) -> Aria2WebsocketClient:
+        """
+        Connect to aria2 and wait until it answers RPC calls.
+
+        Retries with exponential backoff until ``timeout`` seconds have passed, so a
+        freshly spawned daemon is used as soon as it is ready instead of after a fixed sleep.
+        """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        delay = 0.05
+
+        while True:
+            client = None
+            try:
+                client = await Aria2WebsocketClient.new(url=self.url, token=self.secret)
+                await client.getVersion()
+                return client
+            except (Aria2rpcException, OSError):
+                if client is not None:
+                    await client.close()
+                if loop.time() + delay > deadline:
+                    raise
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1)
+
+    async def initialize(self, timeout: float = 15):
+        try:
+            self.client = await self._connect()
+        except (Aria2rpcException, OSError):
+            if not self.is_local:
+                raise
+
+            self.logger.info(f"Initializing aria2 daemon for {self.url}.")
+            os.makedirs(self.download_dir, exist_ok=True)
+            # Queued and active downloads are saved to the session file and reloaded on the next spawn
+            if not os.path.exists(self.session_file):
+                open(self.session_file, "a").close()
+
+            command = (
+                "aria2c --enable-rpc=true --daemon=true --quiet "
+                f"--rpc-listen-port={urlparse(self.url).port or 6800} "
+                f"--save-session={shlex.quote(self.session_file)} "
+                f"--input-file={shlex.quote(self.session_file)} "
+                "--save-session-interval=30"
+            )
+            if self.secret:
+                command += f" --rpc-secret={shlex.quote(self.secret)}"
+            await run_command(command)
+
+            self.client = await self._connect(timeout=timeout)
+
+        await self.client.changeGlobalOption({**GLOBAL_OPTIONS, "dir": self.download_dir})
+
+    async def load(self) -> tuple:
+        """Sort key for job placement: fewest jobs, then lowest total speed, then most free disk."""
+
+        stat = await self.client.getGlobalStat()
+        jobs = int(stat.get("numActive", 0)) + int(stat.get("numWaiting", 0))
+        speed = int(stat.get("downloadSpeed", 0))
+        try:
+            free = shutil.disk_usage(self.download_dir).free if self.is_local else 0
+        except OSError:
+            free = 0
+        return jobs, speed, -free
+
+    async def shutdown(self):
+        await self.client.purgeDownloadResult()
+        await self.client.forceShutdown()
+        await self.client.close()
+        if self.is_local:
+            await self._wait_closed()
+
+    async def _wait_closed(self, timeout: float = 5):
+        """Wait until the daemon stops listening, so its session file is written before we exit."""
+
+        url = urlparse(self.url)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        delay = 0.05
+
+        while loop.time() < deadline:
+            try:
+                _, writer = await asyncio.open_connection(url.hostname, url.port or 6800)
+            except OSError:
+                return
+            writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        self.logger.warning(f"aria2 daemon at {self.url} still running after shutdown request.")
+
+
 class AioAria:
-    def __init__(self, client):
+    """
+    Pool of aria2 daemons behind one interface.
+
+    GIDs handed out by the pool are namespaced per backend (``name:gid``, plain for the
+    default backend), and every GID-taking call is routed to the daemon owning it.
+    """
+
+    def __init__(self, backends: list[Aria2Backend]):
         self.logger = self._setup_logging()
-        self.client: Aria2WebsocketClient = client
+        self.backends = {backend.name: backend for backend in backends}
+
 
-    
     def _setup_logging(self):
         logger = logging.getLogger("AioAria")
         logger.setLevel(logging.INFO)
@@ -22,59 +193,179 @@ class AioAria:
         return logger
 
 
+    @property
+    def default_backend(self) -> Aria2Backend:
+        return next(iter(self.backends.values()))
+
+
+    @property
+    def client(self) -> Aria2WebsocketClient:
+        """RPC client of the default backend."""
+
+        return self.default_backend.client
+
+
     @classmethod
-    async def initialize(cls):
-        try:
-            client: Aria2WebsocketClient = await Aria2WebsocketClient.new(
-                url="http://localhost:6800/jsonrpc"
+    async def initialize(cls, session_file: str = "aria2.session", backends_config: list = None, timeout: float = 15):
+        backends = [Aria2Backend(session_file=session_file)]
+        for config in backends_config or []:
+            name = config["name"]
+            backends.append(
+                Aria2Backend(
+                    name=name,
+                    url=config["url"],
+                    secret=config.get("secret"),
+                    download_dir=config.get("dir", os.path.join(DOWNLOAD_DIR, name)),
+                    session_file=config.get("session_file", f"aria2-{name}.session"),
+                )
             )
-        except Aria2rpcException:
-            logger = logging.getLogger("AioAria")
-            logger.setLevel(logging.INFO)
 
-            logger.info("Initializing aria2 daemon.")
-            await run_command("aria2c --enable-rpc=true --daemon=true --quiet")
-            
-            await asyncio.sleep(2.5)
+        await asyncio.gather(*(backend.initialize(timeout=timeout) for backend in backends))
+
+        return cls(backends)
+
+
+    def resolve(self, gid: str) -> tuple:
+        """Split a pool GID into ``(backend, daemon gid)``."""
+
+        name, sep, raw_gid = gid.rpartition(":")
+        backend = self.backends.get(name)
+        if backend is None:
+            raise Aria2rpcException(f"Unknown aria2 backend for GID {gid}")
+        return backend, raw_gid
+
+
+    def _namespace_status(self, backend: Aria2Backend, status):
+        if isinstance(status, dict):
+            if "gid" in status:
+                status["gid"] = backend.namespace(status["gid"])
+            if status.get("followedBy"):
+                status["followedBy"] = [backend.namespace(gid) for gid in status["followedBy"]]
+        return status
+
+
+    async def pick_backend(self) -> Aria2Backend:
+        if len(self.backends) == 1:
+            return self.default_backend
+
+        backends = list(self.backends.values())
+        loads = await asyncio.gather(*(backend.load() for backend in backends), return_exceptions=True)
+        candidates = [(load, backend) for load, backend in zip(loads, backends) if not isinstance(load, BaseException)]
+        if not candidates:
+            raise Aria2rpcException("No aria2 backend is reachable.")
+        return min(candidates, key=lambda candidate: candidate[0])[1]
+
+
+    async def add_uri(self, uris: list[str], options: dict = None) -> str:
+        """Add a download on the least loaded backend and return its pool GID."""
+
+        backend = await self.pick_backend()
+        with ARIA2_RPC_SECONDS.time(method="addUri"):
+            gid = await backend.client.addUri(uris, options or {})
+        return backend.namespace(gid)
+
+
+    async def add_many(self, calls) -> list:
+        """
+        Add several downloads on the least loaded backend with one ``system.multicall`` round-trip.
+
+        Args:
+            calls: Iterable of ``(method, *params)`` tuples for aria2's adding methods, e.g.
+                ``("addUri", [url], options)`` or ``("addTorrent", torrent_b64, [], options)``.
+
+        Returns:
+            list: One entry per call, either the pool GID (a list of them for ``addMetalink``)
+                or an ``Aria2rpcException``.
+        """
+        calls = list(calls)
+        backend = await self.pick_backend()
+        try:
+            with ARIA2_RPC_SECONDS.time(method="multicall"):
+                response = await backend.client.multicall(
+                    [{"methodName": f"aria2.{method}", "params": list(params)} for method, *params in calls]
+                )
+            results = _parse_multicall(response)
+        except (Aria2rpcException, OSError) as e:
+            return [e] * len(calls)
+
+        return [
+            [backend.namespace(gid) for gid in result] if isinstance(result, list)
+            else backend.namespace(result) if isinstance(result, str)
+            else result
+            for result in results
+        ]
 
-            client: Aria2WebsocketClient = await Aria2WebsocketClient.new(
-                url="http://localhost:6800/jsonrpc"
+
+    async def call(self, method: str, gid: str, *params):
+        """Call a GID-taking aria2 method (``tellStatus``, ``remove``, ...) on the backend owning ``gid``."""
+
+        backend, raw_gid = self.resolve(gid)
+        with ARIA2_RPC_SECONDS.time(method=method):
+            result = await getattr(backend.client, method)(raw_gid, *params)
+        return self._namespace_status(backend, result)
+
+
+    def on_download_complete(self, callback):
+        """
+        Subscribe to aria2's completion push notifications on every backend.
+
+        Args:
+            callback: Coroutine function called with the completed pool GID, for both
+                ``onDownloadComplete`` and ``onBtDownloadComplete``.
+        """
+        for backend in self.backends.values():
+            def make_handler(backend):
+                async def handler(_, data: dict):
+                    for params in data.get("params", []):
+                        gid = params.get("gid")
+                        if gid:
+                            await callback(backend.namespace(gid))
+                return handler
+
+            handler = make_handler(backend)
+            backend.client.onDownloadComplete(handler)
+            backend.client.onBtDownloadComplete(handler)
+
+        return callback
+
+
+    async def multicall(self, calls):
+        """
+        Run several GID-taking aria2 RPC calls with one ``system.multicall`` round-trip per backend.
+
+        Args:
+            calls: Iterable of ``(method, gid, *params)`` tuples, e.g. ``("tellStatus", gid, keys)``.
+
+        Returns:
+            list: One entry per call, either the call result or an ``Aria2rpcException``.
+        """
+        results = [None] * len(calls)
+        grouped = {}
+        for index, (method, gid, *params) in enumerate(calls):
+            try:
+                backend, raw_gid = self.resolve(gid)
+            except Aria2rpcException as e:
+                results[index] = e
+                continue
+            grouped.setdefault(backend.name, (backend, []))[1].append(
+                (index, {"methodName": f"aria2.{method}", "params": [raw_gid, *params]})
             )
-        
-        await client.changeGlobalOption(
-            {
-                "allow-overwrite": "true",
-                "auto-file-renaming": "true",
-                "bt-enable-lpd": "true",
-                "bt-remove-unselected-file": "true",
-                "check-certificate": "false",
-                "content-disposition-default-utf8": "true",
-                "continue": "true",
-                "dir": os.path.join(os.getcwd(), DOWNLOAD_DIR),
-                "disk-cache": "32M",
-                "follow-torrent": "mem",
-                "http-accept-gzip": "true",
-                "max-concurrent-downloads": "3",
-                "max-connection-per-server": "10",
-                "max-file-not-found": "0",
-                "max-overall-download-limit": "0",
-                "max-overall-upload-limit": "1K",
-                "max-tries": "20",
-                "min-split-size": "10M",
-                "reuse-uri": "true",
-                "rpc-max-request-size": "1024M",
-                "seed-time": "0",
-                "split": "10",
-                "summary-interval": "0",
-                "user-agent": "Wget/1.12"
-            }
-        )
-
-        return cls(client)
-
-    
+
+        async def run(backend: Aria2Backend, entries: list):
+            try:
+                with ARIA2_RPC_SECONDS.time(method="multicall"):
+                    response = await backend.client.multicall([call for _, call in entries])
+                backend_results = _parse_multicall(response)
+            except (Aria2rpcException, OSError) as e:
+                backend_results = [e] * len(entries)
+            for (index, _), result in zip(entries, backend_results):
+                results[index] = self._namespace_status(backend, result)
+
+        await asyncio.gather(*(run(backend, entries) for backend, entries in grouped.values()))
+
+        return results
+
+
     async def shutdown(self):
-        self.logger.info("Shutting down aria2 daemon and AioAria client.")
-        await self.client.purgeDownloadResult()
-        await self.client.forceShutdown()
-        await self.client.close()
+        self.logger.info("Shutting down aria2 daemons and AioAria client.")
+        await asyncio.gather(*(backend.shutdown() for backend in self.backends.values()), return_exceptions=True)
@@ -0,0 +1,82 @@
+import os
+import tarfile
+from typing import Callable
+
+from bot.utils.pixeldrain import UploadStreamReader, read_file_chunks
+
+
+class TarMember:
+    def __init__(self, path: str, arcname: str):
+        stat = os.stat(path)
+        info = tarfile.TarInfo(arcname)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = stat.st_mode & 0o777
+
+        self.path = path
+        self.size = stat.st_size
+        self.header = info.tobuf(tarfile.GNU_FORMAT, "utf-8", "surrogateescape")
+        self.padding = -self.size % tarfile.BLOCKSIZE
+
+    @property
+    def archived_size(self) -> int:
+        return len(self.header) + self.size + self.padding
+
+
+def members_from_paths(paths: list[str], base_dir: str) -> list[TarMember]:
+    """Build tar members for ``paths``, named relative to ``base_dir``. Blocking, run it off the event loop."""
+
+    return [TarMember(path, os.path.relpath(path, base_dir)) for path in sorted(paths)]
+
+
+def members_from_directory(directory: str) -> list[TarMember]:
+    """Build tar members for every file below ``directory``, keeping its name as the top folder."""
+
+    directory = os.path.abspath(directory)
+    paths = [
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+    ]
+    return members_from_paths(paths, os.path.dirname(directory))
+
+
+class TarStreamReader(UploadStreamReader):
+    """
+    Upload body generating an uncompressed tar archive on the fly.
+
+    Member headers are built up front, so the archive size is known before the first
+    byte is sent and no temporary archive is ever written to disk.
+    """
+
+    def __init__(
+        self,
+        members: list[TarMember],
+        chunk_size: int = 1024 * 1024,
+        callback: Callable = None,
+        backend: str = "aiofiles",
+    ):
+        total = sum(member.archived_size for member in members) + 2 * tarfile.BLOCKSIZE
+        super().__init__(None, chunk_size=chunk_size, callback=callback, backend=backend, total=total)
+        self.members = members
+
+    async def _read_tar(self):
+        for member in self.members:
+            yield member.header
+
+            sent = 0
+            async for chunk in read_file_chunks(member.path, self.chunk_size, self.backend, member.size):
+                sent += len(chunk)
+                yield chunk
+
+            if sent != member.size:
+                raise Exception(f"{member.path} changed size while archiving.")
+
+            if member.padding:
+                yield bytes(member.padding)
+
+        # End-of-archive marker
+        yield bytes(2 * tarfile.BLOCKSIZE)
+
+    def _chunks(self):
+        return self._read_tar()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import shutil
+
+from aioaria2.exceptions import Aria2rpcException
+
+from bot.utils.aioaria import GLOBAL_OPTIONS
+from bot.utils.metrics import UPLOAD_BYTES
+from bot.utils.tools import readable_bytes
+
+
+class BackpressureController:
+    """
+    Keeps aria2 from downloading faster than Pixeldrain uploads can drain the disk.
+
+    Every ``interval`` seconds it compares each local backend's free disk space with
+    the bytes its running downloads still have to write. Below ``min_free_bytes`` of
+    headroom the newest downloads are paused (and no queued ones are started) until
+    uploads free enough space, then resumed oldest first. While the upload backlog is
+    over ``max_upload_backlog`` bytes, or headroom is getting low, aria2's overall
+    download limit follows the measured upload rate.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.logger = logging.getLogger("Backpressure")
+        # Jobs paused by us, oldest first
+        self.held = []
+        # Backend names whose disk headroom is below the minimum
+        self.low_disk = set()
+        self.limit = None
+        self._last_uploaded = UPLOAD_BYTES.total()
+        self._last_time = None
+        self._task = None
+
+    @property
+    def config(self) -> dict:
+        return self.client.config.get("backpressure", {})
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.config.get("enabled", True))
+
+    @property
+    def disk_low(self) -> bool:
+        return bool(self.low_disk)
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(float(self.config.get("interval", 5)))
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.warning("Backpressure update failed.", exc_info=True)
+
+    def _upload_rate(self) -> float:
+        now = asyncio.get_event_loop().time()
+        uploaded = UPLOAD_BYTES.total()
+        rate = 0
+        if self._last_time is not None and now > self._last_time:
+            rate = (uploaded - self._last_uploaded) / (now - self._last_time)
+        self._last_uploaded, self._last_time = uploaded, now
+        return rate
+
+    async def tick(self):
+        min_free = int(self.config.get("min_free_bytes", 2 * 1024**3))
+        upload_rate = self._upload_rate()
+        self.held = [job for job in self.held if job.gid in self.client.jobs]
+
+        throttle = False
+        for backend in self.client.aioaria.backends.values():
+            if not backend.is_local:
+                continue
+            try:
+                free = (await asyncio.to_thread(shutil.disk_usage, backend.download_dir)).free
+            except OSError:
+                continue
+
+            held = [job for job in self.held if self.client.aioaria.resolve(job.gid)[0] is backend]
+            running = sorted(
+                (
+                    job
+                    for job in self.client.scheduler.running
+                    if job not in held and self.client.aioaria.resolve(job.gid)[0] is backend
+                ),
+                key=lambda job: job.start_time,
+            )
+            remaining = sum(self._remaining(job) for job in running)
+
+            if free - remaining < min_free:
+                self.low_disk.add(backend.name)
+                # Newest first, so the oldest downloads get to finish
+                while running and free - remaining < min_free:
+                    job = running.pop()
+                    if await self._hold(job):
+                        remaining -= self._remaining(job)
+            else:
+                self.low_disk.discard(backend.name)
+                for job in held:
+                    if free - remaining - self._remaining(job) < min_free * 1.1:
+                        break
+                    if await self._release(job):
+                        remaining += self._remaining(job)
+
+            throttle = throttle or free - remaining < min_free * 2
+
+        backlog = self.client.uploads.pending_bytes
+        max_backlog = int(self.config.get("max_upload_backlog", 10 * 1024**3))
+        throttle = throttle or bool(max_backlog and backlog > max_backlog)
+
+        if throttle:
+            limit = max(int(upload_rate), int(self.config.get("min_download_rate", 1024**2)))
+        else:
+            limit = 0
+        await self._set_limit(limit, backlog)
+
+        if not self.disk_low:
+            await self.client.scheduler.dispatch()
+
+    @staticmethod
+    def _remaining(job) -> int:
+        return max(job.total_length - job.completed_length, 0)
+
+    async def _hold(self, job) -> bool:
+        try:
+            await self.client.aioaria.call("pause", job.gid)
+        except Aria2rpcException as e:
+            self.logger.info(f"Failed to pause GID#{job.gid} : {e}", extra=job.log_extra)
+            return False
+        self.held.append(job)
+        self.logger.warning(
+            f"Low disk space, paused GID#{job.gid} ({readable_bytes(self._remaining(job))} left).", extra=job.log_extra
+        )
+        return True
+
+    async def _release(self, job) -> bool:
+        try:
+            await self.client.aioaria.call("unpause", job.gid)
+        except Aria2rpcException as e:
+            # Still held, the next tick retries
+            self.logger.warning(f"Failed to resume GID#{job.gid} : {e}", extra=job.log_extra)
+            return False
+        self.held.remove(job)
+        self.logger.info(f"Disk space recovered, resumed GID#{job.gid}.", extra=job.log_extra)
+        return True
+
+    async def _set_limit(self, limit: int, backlog: int):
+        # Skip small changes, every call is an RPC on each backend
+        if self.limit is not None and (
+            limit == self.limit or (limit and self.limit and abs(limit - self.limit) < self.limit * 0.1)
+        ):
+            return
+
+        backends = list(self.client.aioaria.backends.values())
+        value = str(limit // len(backends)) if limit else GLOBAL_OPTIONS["max-overall-download-limit"]
+        results = await asyncio.gather(
+            *(backend.client.changeGlobalOption({"max-overall-download-limit": value}) for backend in backends),
+            return_exceptions=True,
+        )
+        for backend, result in zip(backends, results):
+            if isinstance(result, BaseException):
+                self.logger.warning(f"Failed to set the download limit on aria2 backend {backend.url}: {result}")
+
+        if limit:
+            self.logger.info(
+                f"Throttling downloads to {readable_bytes(limit)}/s, upload backlog {readable_bytes(backlog)}."
+            )
+        elif self.limit:
+            self.logger.info("Upload backlog drained, download limit lifted.")
+        self.limit = limit
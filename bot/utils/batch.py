@@ -0,0 +1,98 @@
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.utils.tools import MAX_TEXT_LENGTH, readable_bytes
+
+
+STATE_ICONS = {"complete": "✅", "error": "❌", "removed": "❌", "cancelled": "🚫", "active": "⏬", "waiting": "⏳"}
+
+
+class DownloadBatch:
+    """
+    The single status message of many downloads added by one ``/dl``.
+
+    Collapsed, it shows per-state counts and overall progress; expanded, one line per
+    download. The job manager marks a batch dirty whenever one of its jobs would have
+    edited its own message, and renders it once per poll.
+    """
+
+    def __init__(self, client, chat_id: int, message_id: int):
+        self.client = client
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.jobs = []
+        # job -> final event, for jobs that are done
+        self.results = {}
+        # (link, error) for entries aria2 refused to add
+        self.rejected = []
+        self.expanded = False
+
+    @property
+    def key(self) -> tuple:
+        return self.chat_id, self.message_id
+
+    @property
+    def done(self) -> bool:
+        return len(self.results) == len(self.jobs)
+
+    def add(self, job):
+        job.batch = self
+        self.jobs.append(job)
+
+    def reject(self, link: str, error: str):
+        self.rejected.append((link, error))
+
+    def finish(self, job, event: str):
+        self.results[job] = event
+
+    def toggle(self):
+        self.expanded = not self.expanded
+        self.refresh()
+
+    def state(self, job) -> str:
+        if job in self.results:
+            return self.results[job]
+        return "active" if job.status == "active" else "waiting"
+
+    def refresh(self):
+        text = self.render()
+        # A finished batch keeps its text but loses the button, it no longer changes
+        markup = None if self.done else self.keyboard()
+        self.client.editor.edit(self.chat_id, self.message_id, text, reply_markup=markup)
+
+    def render(self) -> str:
+        counts = {}
+        for job in self.jobs:
+            icon = STATE_ICONS[self.state(job)]
+            counts[icon] = counts.get(icon, 0) + 1
+        if self.rejected:
+            counts["❌"] = counts.get("❌", 0) + len(self.rejected)
+
+        running = [job for job in self.jobs if job not in self.results]
+        lines = [
+            f"📦 **{'Batch finished' if self.done else 'Batch'}** : {len(self.jobs) + len(self.rejected)} download(s)",
+            " | ".join(f"{icon} {count}" for icon, count in counts.items()),
+            f"{readable_bytes(sum(job.completed_length for job in self.jobs))} of "
+            f"{readable_bytes(sum(job.total_length for job in self.jobs))} "
+            f"@ {readable_bytes(sum(job.download_speed for job in running))}/s",
+        ]
+
+        # Finished batches only list what went wrong
+        if self.expanded or self.done:
+            lines.append("")
+            for job in self.jobs:
+                state = self.state(job)
+                if self.done and state == "complete":
+                    continue
+                line = f"{STATE_ICONS[state]} `{job.filename}`"
+                if state in ("active", "waiting") and job.total_length:
+                    line += f" {job.completed_length * 100 // job.total_length}%"
+                elif state in ("error", "removed") and job.error_message:
+                    line += f" : {job.error_message}"
+                lines.append(line)
+            lines += [f"❌ `{link}` : {error}" for link, error in self.rejected]
+
+        return "\n".join(lines)[:MAX_TEXT_LENGTH]
+
+    def keyboard(self) -> InlineKeyboardMarkup:
+        label = "▲ Collapse" if self.expanded else "▼ Expand"
+        return InlineKeyboardMarkup([[InlineKeyboardButton(label, callback_data="batch|toggle|")]])
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import logging
+import os
+
+from bot.utils.metrics import UPLOAD_DEDUP_HITS
+from bot.utils.pixeldrain import UploadStreamReader, get_pixeldrain_info
+
+
+DEDUP_MODES = ("off", "partial", "full")
+# Bytes hashed at the start, middle and end of a file for the partial key
+SAMPLE_SIZE = 64 * 1024
+
+
+def partial_key(file_path: str, size: int) -> str:
+    """Cheap content key: SHA-256 of the size and three samples of the file."""
+
+    digest = hashlib.sha256(str(size).encode())
+    with open(file_path, "rb") as f:
+        for offset in sorted({0, max(size // 2 - SAMPLE_SIZE // 2, 0), max(size - SAMPLE_SIZE, 0)}):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentIndex:
+    """
+    Finds local files whose content was already uploaded to Pixeldrain.
+
+    Uploads are indexed by their full SHA-256, computed while streaming, and looked up
+    by size plus a partial key over three 64 KiB samples. ``general.dedup`` selects how a
+    match is trusted: ``full`` (the default) hashes the file to confirm it, ``partial``
+    returns it right away, ``off`` disables the index. Files that differ only outside
+    the samples share a partial key, so ``partial`` can return a link to other content. With ``general.dedup_verify`` the file is
+    also checked against Pixeldrain's file info, and forgotten if it is gone.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.logger = logging.getLogger("ContentIndex")
+
+    @property
+    def mode(self) -> str:
+        mode = self.client.config["general"].get("dedup", "full")
+        return mode if mode in DEDUP_MODES else "off"
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    async def lookup(self, file_path: str, size: int = None) -> tuple:
+        """
+        Look ``file_path`` up in the index.
+
+        Returns:
+            tuple: ``(file_id, key)``, where ``file_id`` is the Pixeldrain ID of identical
+                content or None, and ``key`` is the partial key to ``record`` the upload
+                under (None when dedup is off).
+        """
+        if not self.enabled:
+            return None, None
+
+        size = os.path.getsize(file_path) if size is None else size
+        key = await asyncio.to_thread(partial_key, file_path, size)
+        sha256 = None
+
+        for row in self.client.store.find_content(size, key):
+            if self.mode == "full":
+                sha256 = sha256 or await asyncio.to_thread(file_sha256, file_path)
+                if sha256 != row["sha256"]:
+                    continue
+
+            if self.client.config["general"].get("dedup_verify", False) and not await self._verify(row):
+                self.client.store.delete_content(row["file_id"])
+                continue
+
+            UPLOAD_DEDUP_HITS.inc()
+            self.logger.info(f"{file_path} is already on Pixeldrain as {row['file_id']}, skipping upload.")
+            return row["file_id"], key
+
+        return None, key
+
+    async def _verify(self, row) -> bool:
+        try:
+            info = await get_pixeldrain_info(
+                row["file_id"], self.client.config["general"]["pixeldrain_api_key"], self.client.probe_session
+            )
+        except Exception as e:
+            self.logger.info(f"Pixeldrain file {row['file_id']} failed verification: {e}")
+            return False
+
+        return int(info.get("size", -1)) == row["size"] and info.get("hash_sha256", row["sha256"]) == row["sha256"]
+
+    def record(self, key: str, reader: UploadStreamReader, file_id: str, file_name: str = None):
+        """Index a finished upload of a whole local file under its streamed SHA-256."""
+
+        if key is None or reader.sha256 is None or reader.uploaded != reader.total:
+            return
+        self.client.store.add_content(reader.sha256.hexdigest(), reader.total, key, file_id, file_name)
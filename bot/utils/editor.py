@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from pyrogram.errors import FloodWait, MessageNotModified
+
+from bot.utils.metrics import EDIT_SECONDS, FLOOD_WAITS
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one can be taken right away."""
+
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class EditScheduler:
+    """
+    Single funnel for every Telegram message edit.
+
+    Only the latest pending text per message is kept, edits that would not change
+    the message (text and markup) are skipped, and a global plus a per-chat token
+    bucket keep the edit rate under Telegram's limits, which are lower for groups
+    (negative chat IDs). FloodWait delays the chat instead of dropping the edit.
+    """
+
+    def __init__(
+        self,
+        client,
+        global_rate: float = 20,
+        chat_rate: float = 0.5,
+        group_rate: float = 0.25,
+        chat_burst: float = 3,
+        concurrency: int = 4,
+        history_size: int = 4096,
+    ):
+        self.client = client
+        self.logger = logging.getLogger("EditScheduler")
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        # (chat_id, message_id) -> (text, kwargs), in arrival order
+        self.pending: OrderedDict = OrderedDict()
+        # (chat_id, message_id) -> last (text, kwargs) Telegram accepted, bounded LRU
+        self.sent: OrderedDict = OrderedDict()
+        self.history_size = history_size
+        self.in_flight = set()
+        self._sends = set()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def edit(self, chat_id: int, message_id: int, text: str, **kwargs):
+        """Schedule an edit, replacing any not yet sent text for the same message."""
+
+        key = (chat_id, message_id)
+        if key not in self.pending and key not in self.in_flight and self.sent.get(key) == (text, kwargs):
+            return
+
+        self.pending[key] = (text, kwargs)
+        self._wakeup.set()
+
+    def discard(self, chat_id: int, message_id: int):
+        """Drop any pending edit for a message, e.g. before deleting it."""
+
+        key = (chat_id, message_id)
+        self.pending.pop(key, None)
+        self.sent.pop(key, None)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self.chat_buckets[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    def _next_ready(self, now: float):
+        """Return (key, 0) for the oldest sendable edit, or (None, seconds to wait)."""
+
+        wait = self.global_bucket.delay(now)
+        if wait:
+            return None, wait
+
+        wait = None
+        for key in self.pending:
+            if key in self.in_flight:
+                continue
+            chat_wait = self._chat_bucket(key[0]).delay(now)
+            if not chat_wait:
+                return key, 0
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+
+        return None, wait
+
+    async def _run(self):
+        while True:
+            try:
+                await self._step()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # One bad edit must not stop every later one
+                self.logger.exception("Edit scheduler step failed.")
+
+    async def _step(self):
+        if not self.pending:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+        # Take a send slot before picking the edit, so discard() can't remove it while we wait
+        await self.semaphore.acquire()
+        try:
+            now = time.monotonic()
+            key, wait = self._next_ready(now)
+            if key is not None:
+                text, kwargs = self.pending.pop(key)
+                self.global_bucket.take(now)
+                self._chat_bucket(key[0]).take(now)
+                self.in_flight.add(key)
+                send = asyncio.create_task(self._send(key, text, kwargs))
+                # The send task releases the slot from here on
+                self._sends.add(send)
+                send.add_done_callback(self._sends.discard)
+                return
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+        self.semaphore.release()
+        self._wakeup.clear()
+        try:
+            # Sleep until a token frees up, or wake early for newly scheduled edits
+            await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _send(self, key, text: str, kwargs: dict):
+        chat_id, message_id = key
+        try:
+            if self.sent.get(key) != (text, kwargs):
+                with EDIT_SECONDS.time():
+                    await self.client.edit_message_text(chat_id, message_id, text, **kwargs)
+            self._remember(key, text, kwargs)
+        except MessageNotModified:
+            self._remember(key, text, kwargs)
+        except FloodWait as e:
+            FLOOD_WAITS.inc()
+            self.logger.warning(f"FloodWait of {e.value}s editing message in chat {chat_id}, delaying.")
+            self._chat_bucket(chat_id).blocked_until = time.monotonic() + e.value
+            # Retry unless a newer text was scheduled meanwhile
+            if key not in self.pending:
+                self.pending[key] = (text, kwargs)
+        except Exception as e:
+            self.logger.debug(f"Failed to edit message {message_id} in chat {chat_id}: {e}")
+        finally:
+            self.in_flight.discard(key)
+            self.semaphore.release()
+            self._wakeup.set()
+
+    def _remember(self, key, text: str, kwargs: dict):
+        self.sent[key] = (text, kwargs)
+        self.sent.move_to_end(key)
+        while len(self.sent) > self.history_size:
+            self.sent.popitem(last=False)
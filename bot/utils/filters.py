@@ -1,26 +1,30 @@
 from pyrogram import filters
-from pyrogram.types import Message
+from pyrogram.types import CallbackQuery, Message
 
 from bot.bot_client import BotClient
+from bot.utils.logs import set_log_context
+
+
+def _chat_id(update) -> int:
+    # Button presses carry the chat of the message the keyboard is attached to
+    message = update.message if isinstance(update, CallbackQuery) else update
+    return message.chat.id if message and message.chat else None
 
 
 async def owner_filter(_, client: BotClient, message: Message):
-    if message.sender_chat:
+    # Filters run in the task that then runs the handler, so its logs carry this update's sender
+    set_log_context(user_id=message.from_user.id if message.from_user else None, chat_id=_chat_id(message))
+    if getattr(message, "sender_chat", None) or not message.from_user:
         return False
 
-    return message.from_user.id == int(client.config["required"]["owner_id"])
+    return client.acl.is_owner(message.from_user.id)
 
 
 async def authorized_only_filter(_, client: BotClient, message: Message):
-    users_config = client.config.get("users", {})
-    authorized_users = map(int, users_config.get("authorized_users", "").split())
-    authorized_chats = map(int, users_config.get("authorized_chats", "").split())
-
-    return (
-        message.from_user.id == int(client.config["required"]["owner_id"])
-        or message.from_user.id in authorized_users
-        or message.chat.id in authorized_chats
-    )
+    user_id = message.from_user.id if message.from_user else None
+    set_log_context(user_id=user_id, chat_id=_chat_id(message))
+
+    return client.acl.is_authorized(user_id, _chat_id(message))
 
 
 OWNER_ONLY = filters.create(owner_filter)
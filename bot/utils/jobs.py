@@ -0,0 +1,363 @@
+import asyncio
+import logging
+import os
+import time
+
+from aioaria2.exceptions import Aria2rpcException
+
+from bot.utils.batch import DownloadBatch
+from bot.utils.metrics import JOBS_FINISHED
+from bot.utils.tools import format_duration_us, readable_bytes
+
+
+# Keys requested on every poll. "files" is only requested until the job name is known.
+STATUS_KEYS = ["gid", "status", "totalLength", "completedLength", "downloadSpeed", "errorMessage", "followedBy"]
+NAME_KEYS = STATUS_KEYS + ["files", "bittorrent", "dir"]
+# Extra keys for jobs uploaded while downloading, to know how much of the file is on disk
+STREAM_KEYS = ["bitfield", "pieceLength", "files"]
+
+
+class DownloadJob:
+    def __init__(
+        self,
+        gid: str,
+        chat_id: int,
+        message_id: int,
+        user_id: int = None,
+        url: str = None,
+        stream: bool = False,
+    ):
+        self.gid = gid
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.user_id = user_id
+        self.url = url
+        self.stream = stream
+        self.name = None
+        self.status = "waiting"
+        self.total_length = 0
+        self.completed_length = 0
+        self.download_speed = 0
+        self.error_message = ""
+        self.files = []
+        self.dir = None
+        self.bitfield = ""
+        self.piece_length = 0
+        # DownloadBatch sharing its status message with other jobs, if any
+        self.batch = None
+        self.start_time = asyncio.get_event_loop().time()
+        self.last_update_time = 0
+
+    def update(self, status: dict):
+        self.status = status.get("status", self.status)
+        self.total_length = int(status.get("totalLength", self.total_length))
+        self.completed_length = int(status.get("completedLength", self.completed_length))
+        self.download_speed = int(status.get("downloadSpeed", self.download_speed))
+        self.error_message = status.get("errorMessage", self.error_message)
+
+        self.bitfield = status.get("bitfield", self.bitfield)
+        self.piece_length = int(status.get("pieceLength", self.piece_length))
+
+        self.dir = status.get("dir", self.dir)
+
+        if "files" in status:
+            self.files = status["files"] or []
+
+        bt_name = (status.get("bittorrent") or {}).get("info", {}).get("name")
+        if bt_name:
+            self.name = bt_name
+        elif self.files and self.files[0].get("path"):
+            self.name = os.path.basename(self.files[0]["path"])
+
+    @property
+    def filename(self) -> str:
+        return self.name or "unknown"
+
+    @property
+    def log_extra(self) -> dict:
+        """``extra`` for log calls about this job, for the JSON log format."""
+
+        return {"gid": self.gid, "user_id": self.user_id, "chat_id": self.chat_id}
+
+    @property
+    def selected_paths(self) -> list[str]:
+        """Paths of the downloaded files, skipping unselected torrent files and metadata."""
+
+        return [
+            file_info["path"]
+            for file_info in self.files
+            if file_info.get("path")
+            and file_info.get("selected", "true") == "true"
+            and not file_info["path"].startswith("[METADATA]")
+        ]
+
+    @property
+    def contiguous_length(self) -> int:
+        """Number of leading bytes of the file that are completely downloaded."""
+
+        if self.status == "complete":
+            return self.total_length
+        if not self.piece_length:
+            return 0
+
+        pieces = 0
+        for nibble in self.bitfield:
+            value = int(nibble, 16)
+            if value == 0xF:
+                pieces += 4
+                continue
+            # Count the leading set bits of the first incomplete nibble
+            for bit in (8, 4, 2, 1):
+                if not value & bit:
+                    break
+                pieces += 1
+            break
+
+        return min(pieces * self.piece_length, self.total_length)
+
+    @property
+    def eta(self) -> float:
+        """Remaining time in microseconds, 0 if unknown."""
+
+        if self.download_speed <= 0:
+            return 0
+        return ((self.total_length - self.completed_length) / self.download_speed) * 1_000_000
+
+    def render(self, now: float) -> str:
+        elapsed_usec = int((now - self.start_time) * 1_000_000)
+        return (
+            ("Queued, waiting for a free slot.\n" if self.status in ("paused", "waiting") else "")
+            + f"Name : {self.filename}\n"
+            f"Elapsed : {format_duration_us(elapsed_usec)}\n"
+            f"Downloaded : {readable_bytes(self.completed_length)} of {readable_bytes(self.total_length)}\n"
+            f"ETA : {format_duration_us(self.eta)} @ {readable_bytes(self.download_speed)}/s\n"
+            f"GID : `{self.gid}`"
+        )
+
+
+class JobManager:
+    """
+    Owns every aria2 GID started by the bot and polls all of them with a single
+    ``system.multicall`` round-trip per interval, so RPC cost stays flat no matter
+    how many downloads are running.
+    """
+
+    def __init__(self, client, poll_interval: float = 1.0, edit_interval: float = 10.0):
+        self.client = client
+        self.logger = logging.getLogger("JobManager")
+        self.poll_interval = poll_interval
+        self.edit_interval = edit_interval
+        self.jobs: dict[str, DownloadJob] = {}
+        # Async callables invoked with (job, event) where event is "complete", "error" or "removed"
+        self.finish_callbacks = []
+        # (chat_id, message_id) -> DownloadBatch with unfinished jobs
+        self.batches: dict[tuple, DownloadBatch] = {}
+        # Batches to re-render after the current poll
+        self._dirty = set()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __contains__(self, gid: str) -> bool:
+        return gid in self.jobs
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def get(self, gid: str) -> DownloadJob:
+        return self.jobs.get(gid)
+
+    def values(self) -> list[DownloadJob]:
+        return list(self.jobs.values())
+
+    def add(self, job: DownloadJob):
+        self.jobs[job.gid] = job
+        if job.batch is not None:
+            self.batches[job.batch.key] = job.batch
+        self.client.store.save_job(job.gid, job.chat_id, job.message_id, job.user_id, job.url)
+        self._wakeup.set()
+
+    def cancel(self, gid: str, text: str, flush: bool = True) -> DownloadJob:
+        """
+        Stop tracking a cancelled ``gid`` and say so on its status message.
+
+        When cancelling many jobs, pass ``flush=False`` and call ``flush`` once at the end
+        so shared batch messages are rendered only once.
+        """
+        job = self.pop(gid, "cancelled")
+        if job:
+            if job.batch is not None:
+                job.batch.finish(job, "cancelled")
+            self._edit(job, text)
+            if flush:
+                self.flush()
+        return job
+
+    def pop(self, gid: str, status: str = None) -> DownloadJob:
+        """Stop tracking ``gid``, recording ``status`` as its final state when given."""
+
+        job = self.jobs.pop(gid, None)
+        if job and status:
+            self.client.store.set_job_status(gid, status)
+            JOBS_FINISHED.inc(result=status)
+        return job
+
+    def restore(self):
+        """Resume monitoring the downloads that were still active when the bot stopped."""
+
+        now = time.time()
+        loop_now = asyncio.get_event_loop().time()
+        for row in self.client.store.jobs_by_status("active"):
+            if row["gid"] in self.jobs:
+                continue
+            job = DownloadJob(row["gid"], row["chat_id"], row["message_id"], user_id=row["user_id"], url=row["url"])
+            job.start_time = loop_now - (now - row["created_at"])
+            self.jobs[job.gid] = job
+
+        # Jobs sharing a status message were added as one batch
+        groups = {}
+        for job in self.jobs.values():
+            groups.setdefault((job.chat_id, job.message_id), []).append(job)
+        for (chat_id, message_id), jobs in groups.items():
+            if len(jobs) > 1 and all(job.batch is None for job in jobs):
+                batch = self.batches[(chat_id, message_id)] = DownloadBatch(self.client, chat_id, message_id)
+                for job in jobs:
+                    batch.add(job)
+
+        if self.jobs:
+            self.logger.info(f"Resumed monitoring {len(self.jobs)} download(s).")
+            self._wakeup.set()
+
+    def on_finish(self, callback):
+        self.finish_callbacks.append(callback)
+        return callback
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            if not self.jobs:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            await asyncio.sleep(self.poll_interval)
+
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.warning("Failed to poll aria2 downloads.", exc_info=True)
+
+    async def poll(self):
+        jobs = self.values()
+        if not jobs:
+            return
+
+        calls = [("tellStatus", job.gid, self._keys(job)) for job in jobs]
+        results = await self.client.aioaria.multicall(calls)
+
+        now = asyncio.get_event_loop().time()
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                # GID disappeared (likely cancelled/removed)
+                self.logger.info(f"GID {job.gid} not found during status poll: {result}", extra=job.log_extra)
+                await self._finish(job, "removed", f"Download GID `{job.gid}` not found (cancelled or removed).")
+                continue
+
+            await self._handle(job, result, now)
+
+        self.flush()
+
+    @staticmethod
+    def _keys(job: DownloadJob) -> list[str]:
+        keys = NAME_KEYS if job.name is None else STATUS_KEYS
+        if job.stream:
+            keys = keys + [key for key in STREAM_KEYS if key not in keys]
+        return keys
+
+    async def complete(self, gid: str):
+        """Handle an aria2 completion notification without waiting for the next poll."""
+
+        job = self.get(gid)
+        if job is None:
+            return
+
+        try:
+            status = await self.client.aioaria.call("tellStatus", gid, NAME_KEYS)
+        except Aria2rpcException as e:
+            self.logger.info(f"GID {gid} not found after completion notification: {e}", extra=job.log_extra)
+            return
+
+        await self._handle(job, status, asyncio.get_event_loop().time())
+        self.flush()
+
+    async def _handle(self, job: DownloadJob, status: dict, now: float):
+        job.update(status)
+
+        if job.status == "complete":
+            followed_by = status.get("followedBy")
+            if followed_by:
+                # Metadata/torrent download finished, keep tracking the real download under its new GID
+                self.jobs.pop(job.gid, None)
+                self.client.store.replace_job_gid(job.gid, followed_by[0])
+                job.gid = followed_by[0]
+                job.name = None
+                self.jobs[job.gid] = job
+                try:
+                    # The followed download inherits the parent's options, including a fair-share "pause"
+                    await self.client.aioaria.call("unpause", job.gid)
+                except Aria2rpcException:
+                    pass
+                return
+
+            if await self._finish(job, "complete", f"Download completed.\n{job.filename}"):
+                await self.client.aioaria.call("removeDownloadResult", job.gid)
+        elif job.status in ("error", "removed"):
+            await self._finish(job, job.status, f"Download failed.\n{job.filename}\n{job.error_message}")
+        elif now - job.last_update_time >= self.edit_interval:
+            self._edit(job, job.render(now))
+            job.last_update_time = now
+
+    def _edit(self, job: DownloadJob, text: str):
+        if job.batch is not None:
+            self._dirty.add(job.batch)
+        else:
+            self.client.editor.edit(job.chat_id, job.message_id, text)
+
+    def flush(self):
+        """Render the batches whose jobs changed, once each."""
+
+        for batch in self._dirty:
+            batch.refresh()
+            if batch.done:
+                self.batches.pop(batch.key, None)
+        self._dirty.clear()
+
+    async def _finish(self, job: DownloadJob, event: str, text: str):
+        # Only update the status message if the job is still registered (cancel handler may have already edited+removed it)
+        if self.pop(job.gid, event) is None:
+            return False
+
+        if job.batch is not None:
+            job.batch.finish(job, event)
+        self._edit(job, text)
+
+        for callback in self.finish_callbacks:
+            try:
+                await callback(job, event)
+            except Exception:
+                self.logger.exception(f"Finish callback failed for GID {job.gid}.", extra=job.log_extra)
+
+        return True
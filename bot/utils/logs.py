@@ -0,0 +1,130 @@
+import atexit
+import contextvars
+import copy
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+
+TEXT_FORMAT = "[%(asctime)s] %(name)s | %(levelname)s | %(message)s"
+# Record attributes that identify what a log line is about
+CONTEXT_FIELDS = ("gid", "user_id", "chat_id")
+
+# User and chat of the update being handled, set by the handler filters
+LOG_CONTEXT = contextvars.ContextVar("log_context", default={})
+
+
+def set_log_context(**fields):
+    """Tag every log record of the current task with ``fields`` (``gid``, ``user_id``, ``chat_id``)."""
+
+    LOG_CONTEXT.set(fields)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the log context onto records that don't already carry the field through ``extra``."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = LOG_CONTEXT.get()
+        for field in CONTEXT_FIELDS:
+            if getattr(record, field, None) is None:
+                setattr(record, field, context.get(field))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the context fields as keys instead of part of the message."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep the traceback separate so the JSON formatter can put it in its own key
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_handler(config: dict) -> logging.Handler:
+    path = config.get("file", "bot.log")
+    backup_count = int(config.get("backup_count", 5))
+    rotate = config.get("rotate", "size")
+
+    if rotate == "size":
+        handler = RotatingFileHandler(
+            path, maxBytes=int(config.get("max_bytes", 10 * 1024**2)), backupCount=backup_count, encoding="utf-8"
+        )
+    elif rotate == "time":
+        handler = TimedRotatingFileHandler(
+            path, when=config.get("when", "midnight"), backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        handler = logging.FileHandler(path, encoding="utf-8")
+
+    if rotate in ("size", "time") and config.get("compress", True):
+        handler.namer = lambda name: f"{name}.gz"
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def setup_logging(config: dict) -> QueueListener:
+    """
+    Route every log record through a queue to a background thread.
+
+    The event loop only enqueues records; formatting, writing and rotating ``bot.log``
+    happen on the listener thread. ``config`` is the ``[logging]`` config section.
+    """
+    file_handler = _file_handler(config)
+    json_lines = config.get("format", "text") == "json"
+    file_handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(config.get("level", "INFO").upper())
+
+    listener = QueueListener(queue_handler.queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
+
+
+def stop_logging(listener: QueueListener):
+    """Write out the queued records before the process is replaced, e.g. by ``os.execv``."""
+
+    atexit.unregister(listener.stop)
+    listener.stop()
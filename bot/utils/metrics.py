@@ -0,0 +1,179 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format_labels(self, key: tuple, extra: dict = None) -> str:
+        pairs = list(zip(self.labels, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    def samples(self):
+        return []
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{labels} {value}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def samples(self):
+        return [(self.name, self._format_labels(key), value) for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    """Gauge read from a callback at collection time, returning a number or ``{label tuple: value}``."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self.function = None
+
+    def set_function(self, function):
+        self.function = function
+
+    def collect(self) -> dict:
+        if self.function is None:
+            return {}
+        try:
+            value = self.function()
+        except Exception:
+            logging.getLogger("Metrics").debug(f"Failed to collect {self.name}.", exc_info=True)
+            return {}
+        return value if isinstance(value, dict) else {(): value}
+
+    def samples(self):
+        return [(self.name, self._format_labels(key), value) for key, value in self.collect().items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = None):
+        super().__init__(name, help, labels)
+        self.buckets = buckets or (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+        # label key -> [bucket counts..., sum, count]
+        self.values = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        values = self.values.setdefault(key, [0] * len(self.buckets) + [0, 0])
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                values[index] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def summary(self, **labels) -> tuple:
+        """Return ``(count, average)`` of the observations with these labels, or of all of them."""
+
+        rows = [self.values.get(self._key(labels))] if labels else list(self.values.values())
+        rows = [row for row in rows if row]
+        count = sum(row[-1] for row in rows)
+        total = sum(row[-2] for row in rows)
+        return count, (total / count if count else 0)
+
+    def samples(self):
+        samples = []
+        for key, values in self.values.items():
+            for bound, count in zip(self.buckets, values):
+                samples.append((f"{self.name}_bucket", self._format_labels(key, {"le": bound}), count))
+            samples.append((f"{self.name}_bucket", self._format_labels(key, {"le": "+Inf"}), values[-1]))
+            samples.append((f"{self.name}_sum", self._format_labels(key), values[-2]))
+            samples.append((f"{self.name}_count", self._format_labels(key), values[-1]))
+        return samples
+
+
+REGISTRY: list[Metric] = []
+
+ARIA2_RPC_SECONDS = Histogram("pdmirror_aria2_rpc_seconds", "aria2 RPC round-trip latency.", ("method",))
+JOBS = Gauge("pdmirror_jobs", "Downloads tracked by the bot.", ("state",))
+JOBS_FINISHED = Counter("pdmirror_jobs_finished_total", "Downloads that left the job manager.", ("result",))
+DOWNLOAD_SPEED = Gauge("pdmirror_download_speed_bytes", "Aggregate aria2 download speed in bytes per second.")
+UPLOAD_BYTES = Counter("pdmirror_upload_bytes_total", "Bytes sent to Pixeldrain.")
+UPLOAD_SECONDS = Histogram(
+    "pdmirror_upload_seconds",
+    "Pixeldrain upload duration.",
+    buckets=(1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200),
+)
+UPLOAD_ERRORS = Counter("pdmirror_upload_errors_total", "Failed Pixeldrain uploads.")
+UPLOAD_DEDUP_HITS = Counter(
+    "pdmirror_upload_dedup_hits_total", "Uploads skipped because Pixeldrain already had the content."
+)
+UPLOAD_BACKLOG_BYTES = Gauge("pdmirror_upload_backlog_bytes", "Bytes on disk waiting to be uploaded.")
+UPLOAD_QUEUE_DEPTH = Gauge("pdmirror_upload_queue_depth", "Uploads waiting for a worker.")
+EDIT_SECONDS = Histogram("pdmirror_telegram_edit_seconds", "Telegram message edit latency.")
+FLOOD_WAITS = Counter("pdmirror_telegram_floodwait_total", "FloodWait errors returned by Telegram.")
+LOOP_LAG_SECONDS = Histogram("pdmirror_loop_lag_seconds", "Event loop scheduling lag.")
+UPDATE_QUEUE_DEPTH = Gauge("pdmirror_update_queue_depth", "Updates waiting for a Pyrogram handler worker.")
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+class MetricsServer:
+    """Optional local HTTP endpoint serving the metrics in Prometheus text format."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9100):
+        self.logger = logging.getLogger("Metrics")
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def _handle(self, _):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from bot.utils.metrics import LOOP_LAG_SECONDS
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the event loop thread.
+
+    A background thread snapshots the loop thread's stack every ``interval`` seconds
+    through ``sys._current_frames()``, so nothing is instrumented and the overhead is
+    one stack walk per sample. Time the loop spends idle shows up under ``select``.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.start_time = None
+        self.stop_time = None
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start sampling the calling thread, which must be the one running the event loop."""
+
+        self._thread_id = threading.get_ident()
+        self.start_time = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.stop_time = time.monotonic()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, top: int = 30) -> str:
+        """Top stacks and self-time per function, followed by collapsed stacks for flamegraph tools."""
+
+        duration = (self.stop_time or time.monotonic()) - self.start_time
+        samples = self.samples or 1
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+
+        lines = [
+            f"Duration : {duration:.1f} s | Samples : {self.samples} | Interval : {self.interval * 1000:.1f} ms",
+            "",
+            f"Top {top} functions by self samples",
+        ]
+        lines += [f"{count:>8} {count / samples * 100:6.2f}%  {leaf}" for leaf, count in leaves.most_common(top)]
+
+        lines += ["", f"Top {top} stacks"]
+        for stack, count in self.stacks.most_common(top):
+            lines.append(f"{count:>8} {count / samples * 100:6.2f}%")
+            lines += [f"           {label}" for label in stack[-12:]]
+
+        lines += ["", "Collapsed stacks"]
+        lines += [f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()]
+
+        return "\n".join(lines) + "\n"
+
+
+class LoopWatchdog:
+    """
+    Measures event loop scheduling lag and reports callbacks that block the loop.
+
+    A coroutine wakes up every ``interval`` seconds and records how late it was. A
+    thread watches its heartbeat and, when the loop has been stuck for longer than
+    ``threshold`` seconds, logs the loop thread's current stack, i.e. the slow callback.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.5):
+        self.logger = logging.getLogger("LoopWatchdog")
+        self.threshold = threshold
+        self.interval = interval
+        self.last_beat = time.monotonic()
+        self.max_lag = 0
+        self._thread_id = None
+        self._task = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._task = asyncio.create_task(self._beat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="LoopWatchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _beat(self):
+        while True:
+            start_time = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.last_beat = time.monotonic()
+            lag = max(self.last_beat - start_time - self.interval, 0)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag > self.threshold:
+                self.logger.warning(f"Event loop lagged {lag * 1000:.0f} ms.")
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self.last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled <= self.threshold or beat == reported:
+                continue
+            # Only one report per stall
+            reported = beat
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame)[-15:])
+            self.logger.warning(f"Event loop blocked for over {stalled * 1000:.0f} ms in :\n{stack}")
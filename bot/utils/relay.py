@@ -0,0 +1,48 @@
+import os
+from urllib.parse import unquote, urlparse
+
+import aiohttp
+
+
+# Same user agent aria2 is configured with, so servers answer the relay like they answer aria2
+USER_AGENT = "Wget/1.12"
+
+
+async def probe_url(session: aiohttp.ClientSession, url: str, timeout: float = 10):
+    """
+    HEAD a direct link to find its size and file name.
+
+    Returns:
+        tuple: ``(size, file_name)``, size is None when the server doesn't report it.
+    """
+    async with session.head(
+        url,
+        allow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+        timeout=aiohttp.ClientTimeout(total=timeout),
+    ) as resp:
+        resp.raise_for_status()
+        size = resp.content_length
+        file_name = resp.content_disposition.filename if resp.content_disposition else None
+        final_url = str(resp.url)
+
+    if not file_name:
+        file_name = unquote(os.path.basename(urlparse(final_url).path)) or "file"
+
+    return size, file_name
+
+
+async def relay_chunks(
+    session: aiohttp.ClientSession, url: str, chunk_size: int = 1024 * 1024, idle_timeout: float = 300
+):
+    """
+    Yield the body of ``url`` chunk by chunk; aiohttp's flow control bounds what is buffered.
+
+    The transfer has no overall time limit, it only fails when the server sends nothing
+    for ``idle_timeout`` seconds.
+    """
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=idle_timeout)
+    async with session.get(url, headers={"User-Agent": USER_AGENT}, timeout=timeout) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.content.iter_chunked(chunk_size):
+            yield chunk
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+from pyrogram import raw, utils
+
+from bot.utils.tools import MAX_TEXT_LENGTH
+
+
+def command_key(text: str) -> str:
+    """Hash of a command's text with whitespace normalized, for duplicate detection."""
+
+    return hashlib.sha256(" ".join(text.split()).encode()).hexdigest()
+
+
+class ReplayStage:
+    """
+    Feeds the updates recovered after a restart to the dispatcher, at a bounded rate.
+
+    Commands already handled before the bot went down are skipped using the processed
+    command index in the state store, and so are repeats of the same command by the
+    same user in the same chat within ``replay.dedup_window`` seconds. At most
+    ``replay.max_updates`` updates are replayed, ``replay.rate`` per second, and the
+    owner gets one summary message instead of a burst of replies.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.logger = logging.getLogger("Replay")
+        # (command text or None, update, users, chats) in arrival order
+        self.pending = []
+        # (chat_id, user_id, command key) -> date of the last queued copy
+        self.queued = {}
+        self.duplicates = 0
+        self._task = None
+
+    @property
+    def config(self) -> dict:
+        return self.client.config.get("replay", {})
+
+    @property
+    def window(self) -> float:
+        return float(self.config.get("dedup_window", 600))
+
+    def record(self, message):
+        """Add a handled command to the processed index."""
+
+        if not message.text or not message.chat:
+            return
+        self.client.store.add_processed(
+            message.chat.id,
+            message.id,
+            message.from_user.id if message.from_user else None,
+            command_key(message.text),
+            message.date.timestamp() if message.date else time.time(),
+        )
+
+    @staticmethod
+    def _command(update):
+        """``(chat_id, user_id, text, date, message_id)`` of a recovered command, or None for other updates."""
+
+        message = getattr(update, "message", None)
+        if not isinstance(message, raw.types.Message) or not (message.message or "").startswith("/"):
+            return None
+
+        chat_id = utils.get_peer_id(message.peer_id)
+        if isinstance(message.from_id, raw.types.PeerUser):
+            user_id = message.from_id.user_id
+        else:
+            # Private chats leave from_id out, the sender is the chat
+            user_id = chat_id if chat_id > 0 and not message.out else None
+        return chat_id, user_id, message.message, message.date, message.id
+
+    def add(self, update, users: dict, chats: dict):
+        """Queue a recovered update, unless it repeats a command that was already handled or queued."""
+
+        command = self._command(update)
+        if command is not None:
+            chat_id, user_id, text, date, message_id = command
+            key = command_key(text)
+            store = self.client.store
+            if store.is_processed(chat_id, message_id) or store.find_processed(
+                chat_id, user_id, key, date - self.window
+            ):
+                self.duplicates += 1
+                return
+
+            last = self.queued.get((chat_id, user_id, key))
+            if last is not None and abs(date - last) <= self.window:
+                self.duplicates += 1
+                return
+            self.queued[(chat_id, user_id, key)] = date
+
+        self.pending.append((command and command[2], update, users, chats))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        self.client.store.prune_processed(time.time() - float(self.config.get("index_ttl", 7 * 86400)))
+
+        max_updates = int(self.config.get("max_updates", 50))
+        rate = float(self.config.get("rate", 1))
+        pending, self.pending = self.pending, []
+        self.queued.clear()
+        replay, dropped = pending[:max_updates], pending[max_updates:]
+        duplicates, self.duplicates = self.duplicates, 0
+
+        for index, (_, update, users, chats) in enumerate(replay):
+            if index and rate > 0:
+                await asyncio.sleep(1 / rate)
+            await self.client.dispatcher.updates_queue.put((update, users, chats))
+
+        if replay or dropped or duplicates:
+            self.logger.info(
+                f"Replayed {len(replay)} missed update(s), skipped {duplicates} duplicate(s), dropped {len(dropped)}."
+            )
+            await self._report(len(replay), duplicates, dropped, max_updates)
+
+    async def _report(self, replayed: int, duplicates: int, dropped: list, max_updates: int):
+        text = (
+            f"♻️ Replayed {replayed} update(s) missed while the bot was down.\n"
+            f"Skipped {duplicates} duplicate command(s)."
+        )
+        if dropped:
+            commands = [command for command, *_ in dropped if command]
+            text += f"\nDropped {len(dropped)} over the limit of {max_updates}"
+            text += ", resend them if still needed :\n" if commands else "."
+            text += "\n".join(f"`{command[:100]}`" for command in commands[:20])
+
+        try:
+            await self.client.send_message(self.client.acl.rules.owner_id, text[:MAX_TEXT_LENGTH])
+        except Exception as e:
+            self.logger.warning(f"Failed to send the replay summary to the owner: {e}")
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+import shutil
+
+from bot import DOWNLOAD_DIR
+from bot.utils.tools import readable_bytes
+
+
+def _scan(directory: str) -> dict:
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            if name.endswith(".aria2"):
+                continue
+            try:
+                files[path] = os.path.getsize(path)
+            except OSError:
+                pass
+    return files
+
+
+def _delete(paths: list[str], directory: str) -> tuple:
+    """Delete files with their aria2 control files and emptied parent directories. Returns (deleted, bytes)."""
+
+    deleted = []
+    freed = 0
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            deleted.append(path)
+            continue
+        except OSError:
+            continue
+        deleted.append(path)
+        freed += size
+
+        try:
+            os.remove(f"{path}.aria2")
+        except OSError:
+            pass
+
+        parent = os.path.dirname(path)
+        while parent.startswith(directory + os.sep):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+
+    return deleted, freed
+
+
+class RetentionManager:
+    """
+    Frees ``DOWNLOAD_DIR`` by deleting files that were already uploaded.
+
+    Finished downloads are indexed in the state store with their size, GID and whether
+    they were uploaded. When disk usage crosses ``retention.high_watermark``, uploaded
+    files are deleted least recently used first, in batches on a worker thread, until
+    usage is back under ``retention.low_watermark``. Files of running downloads and of
+    queued or running uploads are never touched.
+    """
+
+    def __init__(self, client, directory: str = DOWNLOAD_DIR):
+        self.client = client
+        self.logger = logging.getLogger("Retention")
+        self.directory = os.path.abspath(directory)
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    @property
+    def config(self) -> dict:
+        return self.client.config.get("retention", {})
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.config.get("enabled", True))
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        await self.reconcile()
+        while True:
+            try:
+                await self.evict()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.warning("Retention sweep failed.", exc_info=True)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=float(self.config.get("interval", 60)))
+            except asyncio.TimeoutError:
+                pass
+
+    async def reconcile(self):
+        """Sync the index with the disk: forget deleted files and index files it never saw."""
+
+        on_disk = await asyncio.to_thread(_scan, self.directory)
+        indexed = {row["path"] for row in self.client.store.indexed_files()}
+
+        missing = [path for path in indexed if path not in on_disk]
+        unknown = [(path, size) for path, size in on_disk.items() if path not in indexed]
+        self.client.store.delete_files(missing)
+        self.client.store.index_files(unknown)
+        if missing or unknown:
+            self.logger.info(f"Retention index synced : {len(unknown)} file(s) added, {len(missing)} removed.")
+
+    async def on_finish(self, job, event: str):
+        """JobManager finish callback indexing the files of a completed download."""
+
+        if event != "complete" or not self.client.aioaria.resolve(job.gid)[0].is_local:
+            return
+        selected = set(job.selected_paths)
+        files = [
+            (os.path.abspath(file_info["path"]), int(file_info.get("length", 0)))
+            for file_info in job.files
+            if file_info.get("path") in selected
+        ]
+        self.client.store.index_files(files, gid=job.gid)
+        self._wakeup.set()
+
+    def mark_uploaded(self, paths: list[str]):
+        if paths:
+            self.client.store.mark_files_uploaded([os.path.abspath(path) for path in paths])
+
+    def _protected(self) -> set:
+        paths = {os.path.abspath(path) for path in self.client.uploads.busy}
+        for job in self.client.jobs.values():
+            paths.update(os.path.abspath(file_info["path"]) for file_info in job.files if file_info.get("path"))
+        return paths
+
+    async def evict(self, needed: int = 0) -> int:
+        """
+        Delete uploaded files if usage plus ``needed`` bytes crosses the high watermark.
+
+        Returns:
+            int: Bytes freed.
+        """
+        high = float(self.config.get("high_watermark", 0.9))
+        low = float(self.config.get("low_watermark", 0.75))
+        batch_size = int(self.config.get("batch_size", 100))
+
+        async with self._lock:
+            usage = await asyncio.to_thread(shutil.disk_usage, self.directory)
+            if usage.used + needed < usage.total * high:
+                return 0
+
+            target = usage.used + needed - usage.total * low
+            protected = self._protected()
+            candidates = [
+                row["path"] for row in self.client.store.eviction_candidates() if row["path"] not in protected
+            ]
+
+            freed = 0
+            deleted_count = 0
+            for start in range(0, len(candidates), batch_size):
+                if freed >= target:
+                    break
+                deleted, batch_freed = await asyncio.to_thread(
+                    _delete, candidates[start:start + batch_size], self.directory
+                )
+                self.client.store.delete_files(deleted)
+                freed += batch_freed
+                deleted_count += len(deleted)
+
+            if deleted_count:
+                self.logger.info(f"Retention freed {readable_bytes(freed)} by deleting {deleted_count} uploaded file(s).")
+            if freed < target:
+                self.logger.warning(
+                    f"Disk usage still above the low watermark, {readable_bytes(target - freed)} more is needed."
+                )
+            return freed
+
+    def _committed(self) -> int:
+        """Bytes running downloads will still write."""
+
+        return sum(max(job.total_length - job.completed_length, 0) for job in self.client.jobs.values())
+
+    async def needs_size(self) -> bool:
+        """Whether a new download's size matters, i.e. usage is already past the low watermark."""
+
+        if not self.enabled:
+            return False
+        usage = await asyncio.to_thread(shutil.disk_usage, self.directory)
+        return usage.used + self._committed() >= usage.total * float(self.config.get("low_watermark", 0.75))
+
+    async def ensure_space(self, size: int) -> str:
+        """Make room for a download of ``size`` bytes. Returns why it won't fit, or None."""
+
+        if not self.enabled or not size:
+            return None
+
+        # Bytes running downloads will still write count as taken
+        committed = self._committed()
+        needed = size + committed
+        await self.evict(needed)
+
+        usage = await asyncio.to_thread(shutil.disk_usage, self.directory)
+        if usage.free < needed:
+            available = max(usage.free - committed, 0)
+            return f"Not enough disk space : {readable_bytes(size)} needed, {readable_bytes(available)} available."
+        return None
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from collections import deque
+
+from aioaria2.exceptions import Aria2rpcException
+
+from bot.utils.aioaria import GLOBAL_OPTIONS
+from bot.utils.jobs import DownloadJob
+from bot.utils.tools import readable_bytes
+
+
+class FairScheduler:
+    """
+    Fair-share admission in front of aria2's download slots.
+
+    Downloads are added paused and only unpaused when a slot frees up, picking the
+    next owner (user, or chat for anonymous senders) by smooth weighted round-robin,
+    so one user queueing many links can't starve the others. Per-user and per-chat
+    job counts and per-user bytes are capped by the ``[quotas]`` config section.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.logger = logging.getLogger("FairScheduler")
+        # owner -> jobs waiting for a slot, in submission order
+        self.waiting: dict[int, deque] = {}
+        # owner -> smooth weighted round-robin counter
+        self.current: dict[int, float] = {}
+        self.running = set()
+        self._lock = asyncio.Lock()
+
+    @property
+    def quotas(self) -> dict:
+        return self.client.config.get("quotas", {})
+
+    @property
+    def slots(self) -> int:
+        return int(GLOBAL_OPTIONS["max-concurrent-downloads"]) * len(self.client.aioaria.backends)
+
+    @staticmethod
+    def owner(job: DownloadJob) -> int:
+        return job.user_id if job.user_id is not None else job.chat_id
+
+    def weight(self, owner: int) -> float:
+        return float(self.quotas.get("weights", {}).get(str(owner), 1))
+
+    def _prune(self):
+        """Forget jobs the job manager no longer tracks (finished, failed or cancelled)."""
+
+        self.running = {job for job in self.running if job.gid in self.client.jobs}
+        for owner in list(self.waiting):
+            queue = deque(job for job in self.waiting[owner] if job.gid in self.client.jobs)
+            if queue:
+                self.waiting[owner] = queue
+            else:
+                del self.waiting[owner]
+                self.current.pop(owner, None)
+
+    def _unfinished(self) -> list[DownloadJob]:
+        self._prune()
+        return [*self.running, *(job for queue in self.waiting.values() for job in queue)]
+
+    def check(self, user_id: int, chat_id: int, count: int = 1) -> str:
+        """Return why ``count`` new downloads would exceed a quota, or None if they are allowed."""
+
+        if user_id is not None and self.client.acl.is_owner(user_id):
+            return None
+
+        jobs = self._unfinished()
+        owner = user_id if user_id is not None else chat_id
+        owned = [job for job in jobs if self.owner(job) == owner]
+
+        max_jobs = int(self.quotas.get("max_jobs_per_user", 0))
+        if max_jobs and len(owned) + count > max_jobs:
+            return f"You already have {len(owned)} unfinished downloads (limit {max_jobs})." + (
+                f" {count} more would exceed it." if count > 1 else ""
+            )
+
+        max_chat_jobs = int(self.quotas.get("max_jobs_per_chat", 0))
+        chat_jobs = sum(1 for job in jobs if job.chat_id == chat_id)
+        if max_chat_jobs and chat_jobs + count > max_chat_jobs:
+            return f"This chat already has {chat_jobs} unfinished downloads (limit {max_chat_jobs})." + (
+                f" {count} more would exceed it." if count > 1 else ""
+            )
+
+        max_bytes = int(self.quotas.get("max_bytes_per_user", 0))
+        owned_bytes = sum(job.total_length for job in owned)
+        if max_bytes and owned_bytes >= max_bytes:
+            return (
+                f"Your unfinished downloads total {readable_bytes(owned_bytes)} "
+                f"(limit {readable_bytes(max_bytes)})."
+            )
+
+        return None
+
+    async def submit(self, *jobs: DownloadJob):
+        """Queue paused jobs and start each as soon as it is its owner's turn."""
+
+        for job in jobs:
+            self.waiting.setdefault(self.owner(job), deque()).append(job)
+        await self.dispatch()
+
+    async def adopt(self, jobs: list[DownloadJob]):
+        """
+        Take over jobs resumed after a restart.
+
+        Only downloads aria2 reports as active keep their slot. The rest go back in their
+        owner's queue, paused so aria2 doesn't start them in its own FIFO order, and are
+        started by ``dispatch`` in fair-share order.
+        """
+        if not jobs:
+            return
+
+        results = await self.client.aioaria.multicall([("tellStatus", job.gid, ["gid", "status"]) for job in jobs])
+        queued = []
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                # Gone from aria2, the job manager's next poll drops it
+                continue
+            job.update(result)
+            if job.status == "active":
+                self.running.add(job)
+            elif job.status in ("waiting", "paused"):
+                queued.append(job)
+
+        # Waiting (not paused) downloads would be started by aria2 itself when a slot frees
+        unpaused = [job for job in queued if job.status == "waiting"]
+        for job, result in zip(unpaused, await self.client.aioaria.multicall([("pause", job.gid) for job in unpaused])):
+            if isinstance(result, Exception):
+                self.logger.info(f"Failed to pause GID#{job.gid} : {result}", extra=job.log_extra)
+
+        for job in sorted(queued, key=lambda job: job.start_time):
+            self.waiting.setdefault(self.owner(job), deque()).append(job)
+        if queued:
+            self.logger.info(f"Adopted {len(self.running)} running and {len(queued)} queued download(s).")
+        await self.dispatch()
+
+    async def on_finish(self, job: DownloadJob, event: str):
+        await self.dispatch()
+
+    def _next_owner(self) -> int:
+        total = 0
+        best = None
+        for owner in self.waiting:
+            weight = self.weight(owner)
+            total += weight
+            self.current[owner] = self.current.get(owner, 0) + weight
+            if best is None or self.current[owner] > self.current[best]:
+                best = owner
+        self.current[best] -= total
+        return best
+
+    async def dispatch(self):
+        """Unpause waiting jobs in weighted round-robin order until every slot is used."""
+
+        async with self._lock:
+            self._prune()
+            # Nothing new starts while the backpressure controller is waiting for disk space
+            while self.waiting and len(self.running) < self.slots and not self.client.backpressure.disk_low:
+                owner = self._next_owner()
+                job = self.waiting[owner].popleft()
+                if not self.waiting[owner]:
+                    del self.waiting[owner]
+                    self.current.pop(owner, None)
+
+                try:
+                    await self.client.aioaria.call("unpause", job.gid)
+                except Aria2rpcException as e:
+                    self.logger.info(f"Failed to start GID#{job.gid} : {e}", extra=job.log_extra)
+                    continue
+
+                self.running.add(job)
+                self.logger.info(
+                    f"Started GID#{job.gid} for {owner} ({len(self.running)}/{self.slots} slots).", extra=job.log_extra
+                )
@@ -0,0 +1,155 @@
+import asyncio
+import math
+
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.utils.jobs import DownloadJob
+from bot.utils.tools import MAX_TEXT_LENGTH, format_duration_us, readable_bytes
+
+
+SORT_KEYS = {
+    "speed": lambda job: -job.download_speed,
+    # Unknown ETAs (0) go last
+    "eta": lambda job: (job.eta == 0, job.eta),
+    "owner": lambda job: (job.user_id if job.user_id is not None else job.chat_id, job.start_time),
+}
+SORT_LABELS = {"speed": "Speed", "eta": "ETA", "owner": "Owner"}
+
+
+class StatusPanel:
+    """
+    A paginated ``/status`` message.
+
+    Each row is rendered only when its job's progress changed since the last refresh,
+    only the current page is rendered at all, and the panel stops refreshing after
+    ``idle_timeout`` seconds without a button press, so idle panels cost no edits.
+    """
+
+    def __init__(
+        self,
+        client,
+        chat_id: int,
+        message_id: int,
+        user_id: int,
+        page_size: int = 10,
+        interval: float = 5,
+        idle_timeout: float = 300,
+    ):
+        self.client = client
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.user_id = user_id
+        self.page_size = page_size
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.page = 0
+        self.sort = "speed"
+        # gid -> (progress signature, rendered row)
+        self.rows: dict[str, tuple] = {}
+        self.touched = asyncio.get_event_loop().time()
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def handle(self, action: str, value: str):
+        """Apply a button press and refresh right away, resuming a paused panel."""
+
+        if action == "page":
+            self.page = max(int(value), 0)
+        elif action == "sort" and value in SORT_KEYS:
+            self.sort = value
+            self.page = 0
+
+        self.touched = asyncio.get_event_loop().time()
+        if self.running:
+            self.refresh()
+        else:
+            self.start()
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            if not self.client.jobs.values():
+                self.rows.clear()
+                self.client.editor.edit(self.chat_id, self.message_id, "✅ No active downloads.")
+                return
+
+            if loop.time() - self.touched > self.idle_timeout:
+                self.refresh(paused=True)
+                return
+
+            self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def refresh(self, paused: bool = False):
+        jobs = self.client.jobs.values()
+        text, pages = self.render(jobs)
+        if paused:
+            text += "\n\n⏸ Updates paused, tap 🔄 to resume."
+        self.client.editor.edit(self.chat_id, self.message_id, text, reply_markup=self.keyboard(pages))
+
+    def _row(self, job: DownloadJob) -> str:
+        signature = (job.status, job.name, job.completed_length, job.total_length, job.download_speed)
+        cached = self.rows.get(job.gid)
+        if cached is None or cached[0] != signature:
+            owner = job.user_id if job.user_id is not None else job.chat_id
+            cached = self.rows[job.gid] = (
+                signature,
+                f"`{job.filename}`\n"
+                f"{readable_bytes(job.completed_length)} of {readable_bytes(job.total_length)} "
+                f"@ {readable_bytes(job.download_speed)}/s\n"
+                f"ETA : {format_duration_us(job.eta)} | Owner : `{owner}` | GID : `{job.gid}`\n",
+            )
+        return cached[1]
+
+    def render(self, jobs: list[DownloadJob]) -> tuple:
+        """Return the text of the current page and the page count."""
+
+        pages = max(math.ceil(len(jobs) / self.page_size), 1)
+        self.page = min(self.page, pages - 1)
+        start = self.page * self.page_size
+        visible = sorted(jobs, key=SORT_KEYS[self.sort])[start:start + self.page_size]
+
+        # Forget rows of jobs that finished
+        gids = {job.gid for job in jobs}
+        for gid in [gid for gid in self.rows if gid not in gids]:
+            del self.rows[gid]
+
+        lines = [f"📥 **Active Downloads** [{len(jobs)}] | Sort : {SORT_LABELS[self.sort]}\n"]
+        lines += [f"**{start + index}.** {self._row(job)}" for index, job in enumerate(visible, 1)]
+        lines.append(
+            f"**Total** : {readable_bytes(sum(job.completed_length for job in jobs))} of "
+            f"{readable_bytes(sum(job.total_length for job in jobs))} "
+            f"@ {readable_bytes(sum(job.download_speed for job in jobs))}/s"
+        )
+
+        return "\n".join(lines)[:MAX_TEXT_LENGTH], pages
+
+    def keyboard(self, pages: int) -> InlineKeyboardMarkup:
+        buttons = []
+        if pages > 1:
+            buttons.append(
+                [
+                    InlineKeyboardButton("«", callback_data=f"status|page|{(self.page - 1) % pages}"),
+                    InlineKeyboardButton(f"{self.page + 1}/{pages}", callback_data="status|refresh|"),
+                    InlineKeyboardButton("»", callback_data=f"status|page|{(self.page + 1) % pages}"),
+                ]
+            )
+        buttons.append(
+            [
+                InlineKeyboardButton(("• " if key == self.sort else "") + label, callback_data=f"status|sort|{key}")
+                for key, label in SORT_LABELS.items()
+            ]
+            + [InlineKeyboardButton("🔄", callback_data="status|refresh|")]
+        )
+        return InlineKeyboardMarkup(buttons)
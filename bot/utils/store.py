@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    gid TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    user_id INTEGER,
+    url TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_user_status ON jobs (user_id, status);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_name TEXT NOT NULL,
+    link TEXT NOT NULL,
+    size INTEGER,
+    gid TEXT,
+    chat_id INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_gid ON uploads (gid);
+
+CREATE TABLE IF NOT EXISTS content (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    partial_key TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    file_name TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS content_size_partial ON content (size, partial_key);
+
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    gid TEXT,
+    uploaded INTEGER NOT NULL DEFAULT 0,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_lru ON files (uploaded, last_access);
+
+CREATE TABLE IF NOT EXISTS processed (
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    user_id INTEGER,
+    command_key TEXT NOT NULL,
+    date REAL NOT NULL,
+    PRIMARY KEY (chat_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS processed_command ON processed (chat_id, command_key, date);
+"""
+
+
+class StateStore:
+    """
+    SQLite (WAL mode) store for bot state, download jobs and upload results.
+
+    Every write touches a single indexed row, so its cost doesn't grow with history,
+    unlike TinyDB which rewrote the whole ``db.json`` document.
+    """
+
+    def __init__(self, path: str = "bot.db"):
+        self.logger = logging.getLogger("StateStore")
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate_tinydb()
+
+    def _migrate_tinydb(self, legacy_path: str = "db.json"):
+        """Import the saved Telegram state from the old TinyDB file once."""
+
+        if not os.path.exists(legacy_path) or self.get_state("state") is not None:
+            return
+
+        try:
+            with open(legacy_path) as f:
+                table = json.load(f).get("bot_settings", {})
+        except Exception:
+            self.logger.warning(f"Failed to read legacy {legacy_path}, skipping migration.", exc_info=True)
+            return
+
+        for document in table.values():
+            if document.get("name") == "state":
+                self.set_state("state", document.get("value", {}))
+                self.logger.info(f"Migrated saved state from {legacy_path}.")
+
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+
+    def close(self):
+        self.conn.close()
+
+    # Key/value bot state
+
+    def get_state(self, name: str):
+        row = self.conn.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return json.loads(row["value"]) if row else None
+
+    def set_state(self, name: str, value):
+        self.conn.execute(
+            "INSERT INTO state (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+            (name, json.dumps(value)),
+        )
+
+    def delete_state(self, name: str):
+        self.conn.execute("DELETE FROM state WHERE name = ?", (name,))
+
+    # Download jobs and their status messages
+
+    def save_job(self, gid: str, chat_id: int, message_id: int, user_id: int = None, url: str = None, status: str = "active"):
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO jobs (gid, chat_id, message_id, user_id, url, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (gid) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+            (gid, chat_id, message_id, user_id, url, status, now, now),
+        )
+
+    def set_job_status(self, gid: str, status: str):
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE gid = ?",
+            (status, time.time(), gid),
+        )
+
+    def replace_job_gid(self, old_gid: str, new_gid: str):
+        self.conn.execute(
+            "UPDATE jobs SET gid = ?, updated_at = ? WHERE gid = ?",
+            (new_gid, time.time(), old_gid),
+        )
+
+    def get_job(self, gid: str):
+        return self.conn.execute("SELECT * FROM jobs WHERE gid = ?", (gid,)).fetchone()
+
+    def jobs_by_status(self, status: str = "active") -> list:
+        return self.conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY created_at", (status,)
+        ).fetchall()
+
+    def jobs_by_user(self, user_id: int, status: str = "active") -> list:
+        return self.conn.execute(
+            "SELECT * FROM jobs WHERE user_id = ? AND status = ? ORDER BY created_at", (user_id, status)
+        ).fetchall()
+
+    # Upload results
+
+    def add_upload(self, file_name: str, link: str, size: int = None, gid: str = None, chat_id: int = None):
+        self.conn.execute(
+            "INSERT INTO uploads (file_name, link, size, gid, chat_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (file_name, link, size, gid, chat_id, time.time()),
+        )
+
+    def uploads_by_gid(self, gid: str) -> list:
+        return self.conn.execute("SELECT * FROM uploads WHERE gid = ? ORDER BY id", (gid,)).fetchall()
+
+    # Content index of files already on Pixeldrain
+
+    def find_content(self, size: int, partial_key: str) -> list:
+        return self.conn.execute(
+            "SELECT * FROM content WHERE size = ? AND partial_key = ? ORDER BY created_at DESC", (size, partial_key)
+        ).fetchall()
+
+    def add_content(self, sha256: str, size: int, partial_key: str, file_id: str, file_name: str = None):
+        self.conn.execute(
+            "INSERT INTO content (sha256, size, partial_key, file_id, file_name, created_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (sha256) DO UPDATE SET file_id = excluded.file_id, file_name = excluded.file_name, "
+            "created_at = excluded.created_at",
+            (sha256, size, partial_key, file_id, file_name, time.time()),
+        )
+
+    def delete_content(self, file_id: str):
+        self.conn.execute("DELETE FROM content WHERE file_id = ?", (file_id,))
+
+    # Files under the download directory, for retention
+
+    def index_files(self, files: list[tuple], gid: str = None):
+        """Record freshly written ``(path, size)`` files as not uploaded yet."""
+
+        now = time.time()
+        self.conn.executemany(
+            "INSERT INTO files (path, size, gid, uploaded, last_access) VALUES (?, ?, ?, 0, ?) "
+            "ON CONFLICT (path) DO UPDATE SET size = excluded.size, gid = excluded.gid, uploaded = 0, "
+            "last_access = excluded.last_access",
+            [(path, size, gid, now) for path, size in files],
+        )
+
+    def mark_files_uploaded(self, paths: list[str]):
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE files SET uploaded = 1, last_access = ? WHERE path = ?", [(now, path) for path in paths]
+        )
+
+    def eviction_candidates(self) -> list:
+        """Uploaded files, least recently used first."""
+
+        return self.conn.execute(
+            "SELECT path, size FROM files WHERE uploaded = 1 ORDER BY last_access, path"
+        ).fetchall()
+
+    def indexed_files(self) -> list:
+        return self.conn.execute("SELECT path, size FROM files").fetchall()
+
+    def delete_files(self, paths: list[str]):
+        self.conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in paths])
+
+    # Commands already handled, so updates replayed after a crash don't run them twice
+
+    def add_processed(self, chat_id: int, message_id: int, user_id: int, command_key: str, date: float):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO processed (chat_id, message_id, user_id, command_key, date) VALUES (?, ?, ?, ?, ?)",
+            (chat_id, message_id, user_id, command_key, date),
+        )
+
+    def is_processed(self, chat_id: int, message_id: int) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM processed WHERE chat_id = ? AND message_id = ?", (chat_id, message_id)
+        ).fetchone() is not None
+
+    def find_processed(self, chat_id: int, user_id: int, command_key: str, since: float) -> bool:
+        """Whether ``user_id`` sent the same command in ``chat_id`` since ``since``."""
+
+        return self.conn.execute(
+            "SELECT 1 FROM processed WHERE chat_id = ? AND command_key = ? AND user_id IS ? AND date >= ? LIMIT 1",
+            (chat_id, command_key, user_id, since),
+        ).fetchone() is not None
+
+    def prune_processed(self, before: float):
+        self.conn.execute("DELETE FROM processed WHERE date < ?", (before,))
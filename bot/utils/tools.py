@@ -3,6 +3,10 @@ import shlex
 import time
 
 
+# Telegram's message length limit
+MAX_TEXT_LENGTH = 4096
+
+
 async def run_command(command, shell=False):
     if shell:
         process = await asyncio.create_subprocess_shell(
@@ -0,0 +1,417 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+
+from bot import DOWNLOAD_DIR
+from bot.utils.archive import TarMember, TarStreamReader, members_from_paths
+from bot.utils.pixeldrain import (
+    IterableStreamReader,
+    TailStreamReader,
+    UploadStreamReader,
+    create_pixeldrain_list,
+    file_link,
+    list_link,
+    make_progress_callback,
+    put_to_pixeldrain,
+)
+
+
+class UploadTask:
+    """
+    A queued Pixeldrain upload.
+
+    Uploads a local ``file_path`` unless ``open_reader`` is given, in which case it is
+    called with the progress callback and must return the upload body (used to stream
+    from sources that are not on disk).
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        chat_id: int,
+        reply_to_message_id: int = None,
+        file_name: str = None,
+        open_reader=None,
+        gid: str = None,
+        size: int = 0,
+    ):
+        self.file_path = file_path
+        self.file_name = file_name or os.path.basename(file_path)
+        self.chat_id = chat_id
+        self.reply_to_message_id = reply_to_message_id
+        self.open_reader = open_reader
+        # aria2 GID the file came from, recorded with the upload result
+        self.gid = gid
+        # Bytes on disk waiting for this upload, for tasks not reading file_path
+        self.size = size
+        # Local files read by this upload, kept from retention until it is done
+        self.paths = [file_path] if file_path else []
+        self.failed_paths = []
+
+
+class ListUploadTask(UploadTask):
+    """Upload several files in parallel and group them into one Pixeldrain list titled ``file_name``."""
+
+    def __init__(
+        self,
+        file_paths: list[str],
+        chat_id: int,
+        title: str,
+        reply_to_message_id: int = None,
+        gid: str = None,
+    ):
+        super().__init__(None, chat_id, reply_to_message_id=reply_to_message_id, file_name=title, gid=gid)
+        self.file_paths = file_paths
+        self.paths = list(file_paths)
+
+
+class UploadPool:
+    """
+    Bounded pool of Pixeldrain upload workers sharing the client's HTTP session.
+
+    Upload concurrency is tuned independently from aria2's ``max-concurrent-downloads``
+    through ``general.upload_workers`` and ``general.upload_queue_size``.
+    """
+
+    def __init__(self, client, workers: int = 2, queue_size: int = 32):
+        self.client = client
+        self.logger = logging.getLogger("UploadPool")
+        self.workers = workers
+        self.queue: asyncio.Queue[UploadTask] = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+        # Enqueue tasks spawned from the job manager, kept so they are not garbage collected
+        self._pending = set()
+        # Upload backlog, watched by the backpressure controller
+        self.queued_bytes = 0
+        self.active_readers = set()
+        # Local paths of queued and running uploads
+        self.busy = Counter()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in [*self._tasks, *self._pending]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._pending, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def pending_bytes(self) -> int:
+        """Bytes on disk still to be uploaded, queued or in flight."""
+
+        return self.queued_bytes + sum(max(reader.total - reader.uploaded, 0) for reader in self.active_readers)
+
+    @staticmethod
+    def _task_size(task: UploadTask) -> int:
+        try:
+            if isinstance(task, ListUploadTask):
+                return sum(os.path.getsize(path) for path in task.file_paths)
+            if task.file_path:
+                return os.path.getsize(task.file_path)
+        except OSError:
+            return 0
+        return task.size
+
+    async def submit(self, task: UploadTask) -> UploadTask:
+        """Queue an upload, waiting for room if the queue is full."""
+
+        task.size = self._task_size(task)
+        self.busy.update(task.paths)
+        try:
+            await self.queue.put(task)
+        except BaseException:
+            self._release(task.paths)
+            raise
+        self.queued_bytes += task.size
+        return task
+
+    def _release(self, paths: list[str]):
+        self.busy.subtract(paths)
+        for path in paths:
+            if self.busy[path] <= 0:
+                del self.busy[path]
+
+    async def mirror_job(self, job, event: str):
+        """JobManager finish callback queueing every downloaded file of a completed job."""
+
+        if event != "complete" or job.stream:
+            return
+
+        # Don't block the job manager's poll loop while archiving or while the queue is full
+        pending = asyncio.create_task(self._mirror(job))
+        self._pending.add(pending)
+        pending.add_done_callback(self._pending.discard)
+
+    async def _mirror(self, job):
+        paths = job.selected_paths
+        mode = self.client.config["general"].get("mirror_multi_file", "archive")
+        if len(paths) > 1 and mode == "archive":
+            members = await asyncio.to_thread(members_from_paths, paths, job.dir or DOWNLOAD_DIR)
+            tasks = [self.archive_task(members, f"{job.filename}.tar", job.chat_id, job.message_id, gid=job.gid)]
+        elif len(paths) > 1 and mode == "list":
+            tasks = [ListUploadTask(paths, job.chat_id, job.filename, reply_to_message_id=job.message_id, gid=job.gid)]
+        else:
+            tasks = [UploadTask(path, job.chat_id, reply_to_message_id=job.message_id, gid=job.gid) for path in paths]
+
+        for task in tasks:
+            await self.submit(task)
+            self.logger.info(f"Queued {task.file_name} from GID#{job.gid} for auto-mirror.", extra=job.log_extra)
+
+    def archive_task(
+        self,
+        members: list[TarMember],
+        file_name: str,
+        chat_id: int,
+        reply_to_message_id: int = None,
+        gid: str = None,
+    ):
+        """Build an upload of ``members`` as a tar archive generated while uploading."""
+
+        task = UploadTask(
+            None,
+            chat_id,
+            reply_to_message_id=reply_to_message_id,
+            file_name=file_name,
+            gid=gid,
+            size=sum(member.size for member in members),
+            open_reader=lambda callback: TarStreamReader(
+                members,
+                chunk_size=self.chunk_size,
+                callback=callback,
+                backend=self.client.config["general"].get("upload_reader", "aiofiles"),
+            ),
+        )
+        task.paths = [member.path for member in members]
+        return task
+
+    def stream_job(self, job):
+        """Upload a single-file download while aria2 is still writing it."""
+
+        task = asyncio.create_task(self._stream(job))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _stream(self, job):
+        async def safe_length():
+            if job.gid not in self.client.jobs and job.status != "complete":
+                raise Exception(f"Download {job.status}. {job.error_message}".strip())
+            return job.contiguous_length
+
+        try:
+            # Wait until aria2 has opened the file and knows its size, or the download ends without one
+            while not (job.files and job.files[0].get("path") and job.total_length):
+                await safe_length()
+                if job.gid not in self.client.jobs:
+                    raise Exception("Download finished before aria2 reported its file.")
+                await asyncio.sleep(1)
+        except Exception as e:
+            self.logger.info(f"Streaming upload of GID#{job.gid} abandoned: {e}", extra=job.log_extra)
+            await self._reply(job, f"Upload while downloading stopped.\n{str(e)[:200]}")
+            return
+
+        if len(job.files) > 1:
+            await self._reply(job, "Upload while downloading only supports single-file downloads.")
+            return
+
+        file_path = job.files[0]["path"]
+        file_name = os.path.basename(file_path)
+        self.busy.update([file_path])
+        try:
+            status_message = await self.client.send_message(
+                job.chat_id,
+                f"Uploading to pixeldrain while downloading.\n`{file_name}`",
+                reply_to_message_id=job.message_id,
+            )
+            reader = TailStreamReader(
+                file_path,
+                total=job.total_length,
+                safe_length=safe_length,
+                chunk_size=self.chunk_size,
+                callback=make_progress_callback(file_name, status_message, self.client.editor),
+            )
+            await self._put(reader, file_name, status_message, gid=job.gid)
+            self.client.retention.mark_uploaded([file_path])
+        except Exception as e:
+            self.logger.error(f"Streaming upload of GID#{job.gid} failed: {e}", exc_info=True, extra=job.log_extra)
+        finally:
+            self._release([file_path])
+
+    async def _reply(self, job, text: str):
+        try:
+            await self.client.send_message(job.chat_id, text, reply_to_message_id=job.message_id)
+        except Exception as e:
+            self.logger.warning(f"Failed to notify chat {job.chat_id} about GID#{job.gid}: {e}", extra=job.log_extra)
+
+    async def _worker(self, index: int):
+        while True:
+            task = await self.queue.get()
+            self.queued_bytes -= task.size
+            try:
+                await self._upload(task)
+                self.client.retention.mark_uploaded([path for path in task.paths if path not in task.failed_paths])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(
+                    f"Upload worker {index} failed to upload {task.file_name}: {e}",
+                    exc_info=True,
+                    extra={"gid": task.gid, "chat_id": task.chat_id},
+                )
+            finally:
+                self._release(task.paths)
+                self.queue.task_done()
+
+    @property
+    def chunk_size(self) -> int:
+        return int(self.client.config["general"].get("upload_chunk_size", 1024 * 1024))
+
+    async def _upload(self, task: UploadTask):
+        if isinstance(task, ListUploadTask):
+            await self._upload_list(task)
+            return
+
+        status_message = await self.client.send_message(
+            task.chat_id,
+            f"Uploading to pixeldrain.\n`{task.file_name}`",
+            reply_to_message_id=task.reply_to_message_id,
+        )
+
+        callback = make_progress_callback(task.file_name, status_message, self.client.editor)
+        if task.open_reader:
+            await self._put(task.open_reader(callback), task.file_name, status_message, gid=task.gid)
+            return
+
+        file_id, content_key = await self.client.dedup.lookup(task.file_path)
+        if file_id:
+            link = file_link(file_id)
+            self.client.editor.edit(
+                status_message.chat.id, status_message.id, f"Upload complete (already on Pixeldrain).\n{link}"
+            )
+            self.client.store.add_upload(task.file_name, link, os.path.getsize(task.file_path), task.gid, task.chat_id)
+            return
+
+        reader = UploadStreamReader(
+            task.file_path,
+            chunk_size=self.chunk_size,
+            callback=callback,
+            backend=self.client.config["general"].get("upload_reader", "aiofiles"),
+            hash_content=content_key is not None,
+        )
+        await self._put(reader, task.file_name, status_message, gid=task.gid, content_key=content_key)
+
+    async def _put(
+        self,
+        reader: UploadStreamReader,
+        file_name: str,
+        status_message,
+        gid: str = None,
+        content_key: str = None,
+    ) -> str:
+        """Upload ``reader`` and report the outcome on ``status_message``."""
+
+        # Readers relaying remote content don't hold any disk space
+        if not isinstance(reader, IterableStreamReader):
+            self.active_readers.add(reader)
+        try:
+            file_id = await put_to_pixeldrain(
+                reader,
+                file_name,
+                self.client.config["general"]["pixeldrain_api_key"],
+                session=self.client.http_session,
+            )
+        except Exception as e:
+            self.client.editor.edit(
+                status_message.chat.id, status_message.id, f"Upload failed.\n`{file_name}`\n{str(e)[:200]}"
+            )
+            raise
+        finally:
+            self.active_readers.discard(reader)
+
+        link = file_link(file_id)
+        self.client.editor.edit(status_message.chat.id, status_message.id, f"Upload complete.\n{link}")
+        self.client.store.add_upload(file_name, link, reader.total, gid, status_message.chat.id)
+        self.client.dedup.record(content_key, reader, file_id, file_name)
+        self.client.logger.info(f"Uploaded {reader.file_path or file_name} to Pixeldrain: {link}")
+        return link
+
+    async def _upload_list(self, task: ListUploadTask):
+        """Upload every file of ``task`` with bounded parallelism and one aggregated progress message."""
+
+        status_message = await self.client.send_message(
+            task.chat_id,
+            f"Uploading {len(task.file_paths)} files to pixeldrain.\n`{task.file_name}`",
+            reply_to_message_id=task.reply_to_message_id,
+        )
+
+        api_key = self.client.config["general"]["pixeldrain_api_key"]
+        backend = self.client.config["general"].get("upload_reader", "aiofiles")
+        semaphore = asyncio.Semaphore(int(self.client.config["general"].get("list_upload_parallel", 4)))
+        readers = [
+            UploadStreamReader(path, chunk_size=self.chunk_size, backend=backend, hash_content=self.client.dedup.enabled)
+            for path in task.file_paths
+        ]
+        total = sum(reader.total for reader in readers)
+        self.active_readers.update(readers)
+        start_time = asyncio.get_event_loop().time()
+        finished = 0
+        async def report(*_):
+            uploaded = sum(reader.uploaded for reader in readers)
+            elapsed = asyncio.get_event_loop().time() - start_time
+            speed = uploaded / elapsed if elapsed > 0 else 0
+            render = make_progress_callback(
+                f"{task.file_name} ({finished}/{len(readers)} files)", status_message, self.client.editor
+            )
+            await render(uploaded, total, speed, uploaded / total if total else 1)
+
+        async def upload_one(reader: UploadStreamReader):
+            nonlocal finished
+            reader.callback = report
+            file_name = os.path.basename(reader.file_path)
+            async with semaphore:
+                file_id, content_key = await self.client.dedup.lookup(reader.file_path, reader.total)
+                if file_id:
+                    reader.uploaded = reader.total
+                else:
+                    file_id = await put_to_pixeldrain(reader, file_name, api_key, session=self.client.http_session)
+                    self.client.dedup.record(content_key, reader, file_id, file_name)
+            finished += 1
+            return file_id
+
+        try:
+            results = await asyncio.gather(*(upload_one(reader) for reader in readers), return_exceptions=True)
+        finally:
+            self.active_readers.difference_update(readers)
+        file_ids = [result for result in results if not isinstance(result, BaseException)]
+        task.failed_paths = [
+            reader.file_path for reader, result in zip(readers, results) if isinstance(result, BaseException)
+        ]
+        failed = [os.path.basename(path) for path in task.failed_paths]
+
+        if not readers:
+            self.client.editor.edit(status_message.chat.id, status_message.id, f"No files to upload.\n`{task.file_name}`")
+            return
+
+        if not file_ids:
+            self.client.editor.edit(
+                status_message.chat.id, status_message.id, f"Upload failed.\n`{task.file_name}`\n{str(results[0])[:200]}"
+            )
+            raise Exception(f"All {len(readers)} uploads of {task.file_name} failed.")
+
+        try:
+            link = list_link(await create_pixeldrain_list(task.file_name, file_ids, api_key, self.client.http_session))
+        except Exception as e:
+            self.client.editor.edit(
+                status_message.chat.id, status_message.id, f"Failed to create Pixeldrain list.\n{str(e)[:200]}"
+            )
+            raise
+
+        text = f"Upload complete.\n{link}"
+        if failed:
+            text += f"\nFailed ({len(failed)}) : " + ", ".join(f"`{name}`" for name in failed[:10])
+        self.client.editor.edit(status_message.chat.id, status_message.id, text)
+        self.client.store.add_upload(task.file_name, link, total, task.gid, task.chat_id)
+        self.client.logger.info(f"Uploaded {len(file_ids)}/{len(readers)} files of {task.file_name} to Pixeldrain list: {link}")